@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# Replays a RECORD_PATH capture through the three strategies and the exit loop on a virtual clock.
+#   python backtest.py capture.jsonl.gz
+#   python backtest.py capture.jsonl.gz --grid ULTRA_TP_X=1.5,2,3 SCALPER_SL_X=0.6,0.7 --procs 8
+import argparse, asyncio, bisect, collections, gzip, itertools, json, logging, os, time, types
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+from standins import offline_env
+offline_env()
+
+import main
+
+SIM_SLIPPAGE = 0.01
+REPLAY_TAIL_S = 3600
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    # Never blocks: whenever the loop would wait for its next timer, the clock jumps straight to it.
+    # Loop time counts from 0 so timer arithmetic keeps full float precision; wall() adds the capture epoch.
+    def __init__(self, epoch: float):
+        super().__init__()
+        self.epoch = epoch
+        self._now = 0.0
+        select = self._selector.select
+
+        def virtual_select(timeout=None):
+            ready = select(0)
+            if not ready and timeout:
+                self._now += timeout
+            return ready
+        self._selector.select = virtual_select
+
+    def time(self) -> float:
+        return self._now
+
+    def wall(self) -> float:
+        return self.epoch + self._now
+
+class Capture:
+    def __init__(self, path: str):
+        self.feeds: List[Tuple[float, str, str]] = []
+        self.ticks: List[Tuple[float, str, float]] = []
+        self.dex: Dict[str, Tuple[List[float], List[Optional[list]]]] = {}
+        self.rug: Dict[str, Dict[str, Any]] = {}
+        self.flow: Dict[str, Tuple[List[float], List[Optional[dict]]]] = {}
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt") as f:
+            for line in f:
+                try:
+                    e = json.loads(line)
+                except ValueError:
+                    continue
+                k, t, mint = e["k"], e["t"], e["m"]
+                if k == "feed":
+                    self.feeds.append((t, mint, e["src"]))
+                elif k == "tick":
+                    self.ticks.append((t, mint, e["p"]))
+                elif k == "dex":
+                    ts, snaps = self.dex.setdefault(mint, ([], []))
+                    ts.append(t)
+                    snaps.append(e["d"])
+                elif k == "rug":
+                    self.rug.setdefault(mint, e["d"])
+                elif k == "flow":
+                    ts, stats = self.flow.setdefault(mint, ([], []))
+                    ts.append(t)
+                    stats.append(e["d"])
+        self.feeds.sort()
+        self.ticks.sort()
+        times = [x[0] for x in self.feeds[:1] + self.ticks[:1]] + [ts[0] for ts, _ in self.dex.values()]
+        self.start = min(times) if times else time.time()
+        self.end = max([x[0] for x in self.feeds[-1:] + self.ticks[-1:]] or [self.start])
+
+    @staticmethod
+    def _at(series: Dict[str, tuple], mint: str, t: float):
+        ts, values = series.get(mint, ((), ()))
+        i = bisect.bisect_right(ts, t) - 1
+        return values[i] if i >= 0 else None
+
+    def dex_at(self, mint: str, t: float) -> Optional[list]:
+        return self._at(self.dex, mint, t)
+
+    def flow_at(self, mint: str, t: float) -> Optional[Dict[str, Any]]:
+        return self._at(self.flow, mint, t)
+
+    def price_at(self, mint: str, t: float) -> Optional[float]:
+        d = self.dex_at(mint, t)
+        return d[0] if d else None
+
+class ReplayDex(main.DexScreenerClient):
+    def __init__(self, capture: Capture):
+        super().__init__()
+        self.capture = capture
+
+    async def _load(self, chunk: List[str]) -> Dict[str, Optional[main.PairSnapshot]]:
+        self.requests += 1
+        now = main.time.time()
+        result = {}
+        for token in chunk:
+            d = self.capture.dex_at(token, now)
+            result[token] = main.PairSnapshot(token, *d) if d else None
+            self._store(token, result[token])
+        return result
+
+class ReplayFlow(main.TradeFlow):
+    # Bitquery trades are not captured; the volume gate and ML features read the window stats that
+    # were recorded when each mint was screened live.
+    def __init__(self, capture: Capture):
+        super().__init__()
+        self.capture = capture
+
+    def stats(self, mint: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        return self.capture.flow_at(mint, now or main.time.time())
+
+class SimToxiBot:
+    def __init__(self, capture: Capture, slippage: float = SIM_SLIPPAGE):
+        self.capture = capture
+        self.slippage = slippage
+        self.tokens: collections.Counter = collections.Counter()
+        self.spent: collections.Counter = collections.Counter()
+        self.received: collections.Counter = collections.Counter()
+        self.buys = 0
+        self.sells = 0
+        self.unfilled = 0
+
+    async def send_buy(self, mint: str, amount: float, price_limit=None):
+        # Confirmations go through main.fills once the handler has opened the position, like a bot reply.
+        loop = asyncio.get_running_loop()
+        price = self.capture.price_at(mint, main.time.time())
+        if not price or (price_limit and price > price_limit):
+            self.unfilled += 1
+            loop.call_soon(main.fills.reject, mint, "no fill at limit")
+            return
+        self.buys += 1
+        fill = price * (1 + self.slippage)
+        self.tokens[mint] += amount / fill
+        self.spent[mint] += amount
+        loop.call_soon(main.fills.confirm, mint, fill, amount)
+
+    async def cancel(self, mint: str):
+        pass
+
+    async def send_sell(self, mint: str, perc: int = 100, **kw):
+        price = self.capture.price_at(mint, main.time.time())
+        qty = self.tokens[mint] * perc / 100
+        if not price or not qty:
+            return
+        self.sells += 1
+        self.tokens[mint] -= qty
+        self.received[mint] += qty * price * (1 - self.slippage)
+
+    def report(self) -> Dict[str, Any]:
+        marked = sum(qty * (self.capture.price_at(m, self.capture.end + REPLAY_TAIL_S) or 0) for m, qty in self.tokens.items())
+        spent, received = sum(self.spent.values()), sum(self.received.values())
+        return {"spent": spent, "received": received, "open_value": marked, "pl": received + marked - spent,
+                "buys": self.buys, "sells": self.sells, "unfilled": self.unfilled}
+
+# Every main global replay() rebuilds; run_backtest puts the originals back afterwards.
+REPLAY_GLOBALS = (
+    "toxibot", "journal", "positions", "blacklisted_tokens", "blacklisted_devs", "recent_rugdevs", "activity_log",
+    "exposure", "daily_loss", "community_token_queue", "trade_flow", "exit_engine", "upstreams", "dex", "rug_cache",
+    "community_votes", "pipeline", "fills", "executor", "feeds", "liq_sampler", "ml", "_fetch_rugcheck", "time",
+)
+
+async def replay(capture: Capture, tail: float) -> Dict[str, Any]:
+    # Every piece of mutable module state is rebuilt so consecutive runs in one process are independent.
+    sim = SimToxiBot(capture)
+    main.toxibot = sim
+    main.journal = main.StateJournal(main.STATE_DIR)
+    main.positions = main.PositionTable()
+    main.blacklisted_tokens = main.JournaledSet("bl_token")
+    main.blacklisted_devs = main.JournaledSet("bl_dev")
+    main.recent_rugdevs = set()
+    main.activity_log = main.EventRing(main.EVENT_RING_SIZE)
+    main.exposure = main.daily_loss = 0.0
+    main.community_token_queue = asyncio.Queue()
+    main.trade_flow = ReplayFlow(capture)
+    main.exit_engine = main.ExitEngine()
+    main.upstreams = {name: main.UpstreamPolicy(name, rate, burst, hedge=name in main.UPSTREAM_HEDGED)
+                      for name, (rate, burst) in main.UPSTREAM_LIMITS.items()}
+    main.dex = ReplayDex(capture)
+    main.rug_cache = main.RugVerdictCache(":memory:")
+    main.community_votes = main.VoteAggregator()
+    main.pipeline = main.IngestPipeline(main.process_token)
+    main.fills = main.FillTracker()
+    main.executor = main.Executor(main.MAX_EXPOSURE_SOL)
+    main.feeds = main.FeedSupervisor()
+    main.liq_sampler = main.LiquiditySampler()
+    main.ml = main.MLScorer(main.ml.model)
+
+    async def replay_rugcheck(token: str) -> Dict[str, Any]:
+        data = capture.rug.get(token, {})
+        main.rug_cache.put(token, data)
+        if not data:
+            raise main.UpstreamError(f"no rugcheck verdict captured for {token}")
+        return data
+    main._fetch_rugcheck = replay_rugcheck
+    main.exit_engine.connected = bool(capture.ticks)
+
+    background = [asyncio.ensure_future(c) for c in (
+        main.pipeline.run(), main.fills.run(), main.liq_sampler.run(), main.community_trade_manager(),
+        main.update_position_prices_and_wallet())]
+    events = sorted([(t, 0, m, src) for t, m, src in capture.feeds] + [(t, 1, m, p) for t, m, p in capture.ticks])
+    for t, kind, mint, arg in events:
+        now = main.time.time()
+        if t > now:
+            await asyncio.sleep(t - now)
+        if kind == 0:
+            await main.on_feed_token(mint, arg)
+        else:
+            await main.exit_engine.on_trade({"mint": mint, "txType": "buy", "solAmount": arg, "tokenAmount": 1.0})
+    await asyncio.sleep(tail)
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    report = sim.report()
+    report["open_positions"] = len(main.positions)
+    report["dex_requests"] = main.dex.requests
+    return report
+
+def run_backtest(path: str, params: Dict[str, Any], tail: float = REPLAY_TAIL_S) -> Dict[str, Any]:
+    logging.getLogger("toxibot").setLevel(logging.WARNING)
+    saved = {name: getattr(main, name) for name in (*params, *REPLAY_GLOBALS)}
+    for name, value in params.items():
+        setattr(main, name, value)
+    capture = Capture(path)
+    loop = VirtualTimeLoop(capture.start)
+    main.time = types.SimpleNamespace(time=loop.wall, monotonic=loop.time, perf_counter=time.perf_counter, sleep=time.sleep)
+    t0 = time.perf_counter()
+    try:
+        report = loop.run_until_complete(replay(capture, tail))
+    finally:
+        loop.close()
+        for name, value in saved.items():
+            setattr(main, name, value)
+    report.update(params=params, events=len(capture.feeds) + len(capture.ticks),
+                  virtual_s=round(capture.end - capture.start + tail, 1), wall_s=round(time.perf_counter() - t0, 2))
+    return report
+
+def _run_one(args):
+    return run_backtest(*args)
+
+def parse_grid(specs: List[str]) -> List[Dict[str, Any]]:
+    axes = []
+    for spec in specs:
+        name, values = spec.split("=", 1)
+        cast = type(getattr(main, name))
+        axes.append([(name, cast(v)) for v in values.split(",")])
+    return [dict(combo) for combo in itertools.product(*axes)] or [{}]
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("capture")
+    ap.add_argument("--grid", nargs="*", default=[], help="PARAM=v1,v2 ... (cartesian product)")
+    ap.add_argument("--procs", type=int, default=os.cpu_count())
+    ap.add_argument("--tail", type=float, default=REPLAY_TAIL_S, help="virtual seconds to keep managing exits after the last event")
+    ap.add_argument("--json", default="", help="write all results to this file")
+    args = ap.parse_args()
+    combos = parse_grid(args.grid)
+    if len(combos) == 1:
+        results = [run_backtest(args.capture, combos[0], args.tail)]
+    else:
+        # One fresh process per combo: nothing a run leaves behind in main can leak into the next.
+        with ProcessPoolExecutor(max_workers=args.procs, max_tasks_per_child=1) as ex:
+            results = list(ex.map(_run_one, [(args.capture, c, args.tail) for c in combos]))
+    results.sort(key=lambda r: r["pl"], reverse=True)
+    for r in results:
+        print(f"P/L {r['pl']:+.4f} SOL  buys={r['buys']} sells={r['sells']} unfilled={r['unfilled']} "
+              f"open={r['open_positions']} wall={r['wall_s']}s  {r['params']}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=1)
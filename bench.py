@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# End-to-end benchmark: pump.fun subscribeNewToken event -> ToxiBotClient.send_buy, against local
+# stand-ins for pumpportal, DexScreener, rugcheck and Helius (RPC and websocket, driven by the wallet
+# tracker) running in a separate process.
+#   python bench.py --rates 5,20,50,100 --stage-seconds 10 --out bench_results.json
+import argparse, asyncio, json, logging, multiprocessing as mp, os, subprocess, time
+from typing import Dict, Any, List
+
+from standins import PumpPortalStandIn, UpstreamStandIn, FakeTelegramSink, offline_env
+offline_env()
+
+import main
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def git_version() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except Exception:
+        return "unknown"
+
+# ---- stand-in process ----
+async def _standins(q, args):
+    pumpportal = await PumpPortalStandIn().start()
+    upstream = await UpstreamStandIn(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate).start()
+    q.put(("ready", pumpportal.url, upstream.url, upstream.ws_url))
+    while not pumpportal.new_token_clients:
+        await asyncio.sleep(0.05)
+    for rate in args.rates:
+        emits: Dict[str, float] = {}
+        start = time.time()
+        for i in range(int(rate * args.stage_seconds)):
+            delay = start + i / rate - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            mint = f"bench{rate}n{i}pump"
+            emits[mint] = time.time()
+            await pumpportal.push_new_token(mint)
+        q.put(("stage", rate, start, time.time(), emits))
+        await asyncio.sleep(args.drain)
+    q.put(("done", dict(upstream.requests)))
+    await asyncio.Future()
+
+def standin_process(q, args):
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(_standins(q, args))
+
+# ---- bot side ----
+async def lag_probe(samples: List[tuple], interval: float = 0.05):
+    loop = asyncio.get_running_loop()
+    while True:
+        t0 = loop.time()
+        await asyncio.sleep(interval)
+        samples.append((time.time(), loop.time() - t0 - interval))
+
+async def run_bench(args) -> Dict[str, Any]:
+    q = mp.Queue()
+    proc = mp.Process(target=standin_process, args=(q, args), daemon=True)
+    proc.start()
+    loop = asyncio.get_running_loop()
+    get = lambda: loop.run_in_executor(None, q.get)
+    _, ws_url, http_url, helius_ws_url = await get()
+
+    main.PUMPPORTAL_WS_URL = ws_url
+    main.DEXSCREENER_URL = f"{http_url}/latest/dex/tokens/"
+    main.RUGCHECK_URL = f"{http_url}/api/check/"
+    main.liq_sampler = main.LiquiditySampler(interval=args.sample_interval)
+    main.dex = main.DexScreenerClient(ttl=min(main.DEX_CACHE_TTL, args.sample_interval * 0.75))
+    main.wallet = main.WalletTracker("BenchWa11et1111111111111111111111111111111", f"{http_url}/rpc", helius_ws_url)
+    sink = FakeTelegramSink(latency=args.tg_latency)
+    main.toxibot = main.OrderDispatcher(main.ToxiBotClient(0, "", "", "@bench", client=sink), rate=args.tg_rate, burst=args.tg_burst)
+
+    lag: List[tuple] = []
+    tasks = [asyncio.ensure_future(c) for c in (
+        main.feeds.supervise("pumpfun", main.pumpfun_newtoken_feed, main.on_feed_token), main.pipeline.run(),
+        main.liq_sampler.run(), main.toxibot.run(), main.journal.run(), main.wallet.run(), lag_probe(lag))]
+    stages = []
+    handled_mark = 0
+    try:
+        while True:
+            msg = await get()
+            if msg[0] == "done":
+                upstream_requests = msg[1]
+                break
+            _, rate, start, end, emits = msg
+            await asyncio.sleep(args.drain)
+            cutoff = time.time()
+            handled_total = sum(s["handled"] for s in main.pipeline.stats.values())
+            handled, handled_mark = handled_total - handled_mark, handled_total
+            lat = [sink.first_buy[m] - t for m, t in emits.items() if m in sink.first_buy]
+            # Tokens still being screened, or bought with the order still queued, are censored at the
+            # cutoff, so a backed-up queue pushes the percentiles up instead of dropping out of them.
+            censored = [cutoff - t for m, t in emits.items() if m not in sink.first_buy and (
+                m in main.pipeline.pending or m in main.positions)]
+            window = [v for ts, v in lag if start <= ts <= end + args.drain]
+            stages.append({
+                "feed_rate": rate, "emitted": len(emits), "ordered": len(lat), "censored": len(censored),
+                "unordered": len(emits) - len(lat),
+                "signal_to_order_p50_ms": round(percentile(lat + censored, 0.50) * 1000, 1),
+                "signal_to_order_p99_ms": round(percentile(lat + censored, 0.99) * 1000, 1),
+                "signal_to_order_max_ms": round(max(lat + censored, default=0) * 1000, 1),
+                "handled": handled,
+                "handled_per_s": round(handled / max(end - start + args.drain, 1e-9), 1),
+                "orders_per_s": round(len(lat) / max(end - start + args.drain, 1e-9), 1),
+                "queue_depth": main.pipeline.depth(),
+                "order_queue_depth": main.toxibot.depth(),
+                "order_queue_p99_ms": round(percentile(list(main.toxibot.queue_latency), 0.99) * 1000, 1),
+                "loop_lag_p50_ms": round(percentile(window, 0.50) * 1000, 2),
+                "loop_lag_p99_ms": round(percentile(window, 0.99) * 1000, 2),
+                "loop_lag_max_ms": round(max(window, default=0) * 1000, 2),
+                "rss_mb": round(rss_mb(), 1),
+                "open_positions": len(main.positions),
+            })
+            print(json.dumps(stages[-1]), flush=True)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await main.dex.close()
+        proc.terminate()
+    return {
+        "version": git_version(), "timestamp": time.time(),
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        "upstream_requests": upstream_requests, "dex_requests": main.dex.requests,
+        "dex_cache_hits": main.dex.hits, "wallet": dict(main.wallet.stats),
+        "helius_policy": dict(main.upstreams["helius"].stats), "stages": stages,
+    }
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rates", type=lambda s: [float(x) for x in s.split(",")], default=[5, 20, 50, 100])
+    ap.add_argument("--stage-seconds", type=float, default=10)
+    ap.add_argument("--drain", type=float, default=5, help="seconds to let in-flight tokens finish after each stage")
+    ap.add_argument("--latency", type=float, default=0.05, help="mean upstream latency (s)")
+    ap.add_argument("--jitter", type=float, default=0.02)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--tg-latency", type=float, default=0.0, help="fake Telegram send latency (s)")
+    ap.add_argument("--tg-rate", type=float, default=main.TG_RATE_PER_S, help="ToxiBot commands per second")
+    ap.add_argument("--tg-burst", type=float, default=main.TG_BURST)
+    ap.add_argument("--sample-interval", type=float, default=main.ULTRA_SAMPLE_INTERVAL)
+    ap.add_argument("--out", default="bench_results.json")
+    args = ap.parse_args()
+    logging.getLogger("toxibot").setLevel(logging.WARNING)
+    result = asyncio.run(run_bench(args))
+    with open(args.out, "w") as f:
+        json.dump(result, f, indent=1)
+    print(f"wrote {args.out}")
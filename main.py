@@ -1,9 +1,20 @@
 #!/usr/bin/env python3
-import os, sys, asyncio, logging, json, time, random, aiohttp, websockets, collections
-from telethon import TelegramClient
+import os, sys, re, asyncio, logging, json, time, random, sqlite3, heapq, gzip, threading, contextlib, zlib, aiohttp, websockets, collections
+import multiprocessing as mp
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from telethon import TelegramClient, events
 from telethon.sessions import StringSession
+from telethon.errors import FloodWaitError
 from aiohttp import web
 from typing import Set, Dict, Any, Optional, List
+from dataclasses import dataclass
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
 
 # === PARAMETERS TO EDIT ===
 ULTRA_MIN_LIQ = 8
@@ -12,6 +23,9 @@ ULTRA_TP_X = 2.0
 ULTRA_SL_X = 0.7
 ULTRA_MIN_RISES = 2
 ULTRA_AGE_MAX_S = 120
+ULTRA_SAMPLE_INTERVAL = 2
+ULTRA_SAMPLES = 3
+ULTRA_SAMPLE_DEPTH = 8
 
 SCALPER_BUY_AMOUNT = 0.10
 SCALPER_MIN_LIQ = 8
@@ -28,9 +42,75 @@ COMM_SL_PCT = 0.6
 COMM_TRAIL = 0.4
 COMM_HOLD_SECONDS = 2*24*60*60
 COMM_MIN_SIGNALS = 2
+COMM_VOTE_WINDOW_S = 30*60
 
 ANTI_SNIPE_DELAY = 2
 ML_MIN_SCORE = 60
+MAX_EXPOSURE_SOL = 0.0  # SOL in open and in-flight buys; 0 = no cap
+
+# === NETWORK TUNING ===
+DEX_CACHE_TTL = 1.5  # must stay below ULTRA_SAMPLE_INTERVAL
+DEX_CACHE_MAX = 5000
+DEX_TIMEOUT = 6
+DEX_POOL_SIZE = 20
+DEX_BATCH_SIZE = 30
+EXIT_TICK_STALE_S = 10
+EXIT_SYNC_INTERVAL = 1.0
+SCREEN_DEADLINE_S = 5.0
+RUG_TTL_GOOD = 30*60
+RUG_TTL_BAD = 24*60*60
+RUG_TTL_ERROR = 60
+RUG_CACHE_MAX = 200_000
+JOURNAL_FLUSH_INTERVAL = 0.2
+EVENT_RING_SIZE = 2000
+TG_RATE_PER_S = float(os.environ.get("TG_RATE_PER_S", "1.0"))
+TG_BURST = 5
+FILL_TIMEOUT_MARKET_S = 45
+FILL_TIMEOUT_LIMIT_S = 10*60
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+LAG_PROBE_INTERVAL = 0.5
+PROFILE_MAX_S = 60
+PROFILE_MIN_INTERVAL_S = 0.005
+UPSTREAM_LIMITS = {"dexscreener": (5.0, 10), "rugcheck": (5.0, 10), "helius": (10.0, 20)}  # req/s, burst
+UPSTREAM_HEDGED = {"dexscreener", "rugcheck"}
+UPSTREAM_MIN_RATE_FRAC = 0.1
+UPSTREAM_RATE_STEP = 0.02
+UPSTREAM_MAX_WAIT_S = 2.0
+UPSTREAM_FAIL_THRESHOLD = 5
+UPSTREAM_COOLDOWN_S = 15
+HEDGE_DEFAULT_S = 1.0
+HEDGE_MIN_S = 0.2
+HEDGE_QUANTILE = 0.9
+WALLET_RECONCILE_S = 5*60
+WALLET_RECONCILE_DEBOUNCE_S = 2.0
+FEED_SEEN_TTL_S = 20*60
+FEED_SEEN_MAX = 200_000
+FEED_PING_S = 20
+FEED_PING_TIMEOUT_S = 20
+FEED_BACKOFF_BASE_S = 1.0
+FEED_BACKOFF_MAX_S = 60.0
+FEED_HEALTHY_S = 60
+FEED_REPORT_S = 60
+FLOW_BUCKET_S = 15
+FLOW_SHORT_S = 5*60
+FLOW_LONG_S = 60*60
+FLOW_MIN_VOL_SOL = 25.0
+FLOW_MIN_BUYERS = 20
+FLOW_SURGE_X = 2.0
+FLOW_PRUNE_EVERY = 5000
+TOKEN_PROGRAMS = ("TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA", "TokenzQdBNbLqP5VEhdkAS6EPFLC1PHnBqCXEpPxuEb")
+SSE_BACKLOG = 200
+SSE_HEARTBEAT_S = 15
+JOURNAL_SNAPSHOT_INTERVAL = 10*60
+JOURNAL_SNAPSHOT_EVERY = 5000
+ULTRA_SCREEN_DEADLINE_S = 10.0
+PIPELINE_WORKERS = int(os.environ.get("PIPELINE_WORKERS", "32"))
+PIPELINE_QUEUE_MAX = 500
+PIPELINE_DROP_POLICY = "drop_oldest"  # or "drop_newest"
+SHARD_WORKERS = int(os.environ.get("SHARD_WORKERS", "0"))  # 0 = screen in-process
+SHARD_WRITE_BUFFER_MAX = 1 << 20
+SHARD_FLOW_MAX = 50_000
 
 # === ENV VARS ===
 TELEGRAM_API_ID = int(os.environ["TELEGRAM_API_ID"])
@@ -39,11 +119,20 @@ TELEGRAM_STRING_SESSION = os.environ["TELEGRAM_STRING_SESSION"]
 TOXIBOT_USERNAME = os.environ.get("TOXIBOT_USERNAME", "@toxi_solana_bot")
 RUGCHECK_API = os.environ.get("RUGCHECK_API", "")
 HELIUS_API_KEY = os.environ.get("HELIUS_API_KEY", "")
-HELIUS_RPC_URL = os.environ.get("HELIUS_RPC_URL", "")
+HELIUS_RPC_URL = os.environ.get("HELIUS_RPC_URL", "") or (f"https://rpc.helius.xyz/?api-key={HELIUS_API_KEY}" if HELIUS_API_KEY else "")
+HELIUS_WS_URL = os.environ.get("HELIUS_WS_URL", "") or (f"wss://mainnet.helius-rpc.com/?api-key={HELIUS_API_KEY}" if HELIUS_API_KEY else "")
 WALLET_ADDRESS = os.environ.get("WALLET_ADDRESS", "")
 MORALIS_API_KEY = os.environ.get("MORALIS_API_KEY", "")
 BITQUERY_API_KEY = os.environ.get("BITQUERY_API_KEY", "")
+BITQUERY_WS_URL = os.environ.get("BITQUERY_WS_URL", "wss://streaming.bitquery.io/eap")
 PORT = int(os.environ.get("PORT", "8080"))
+STATE_DIR = os.environ.get("STATE_DIR", "state")
+MODEL_PATH = os.environ.get("MODEL_PATH", "model.npy")
+SHARD_SOCKET = os.environ.get("SHARD_SOCKET", "") or os.path.join(STATE_DIR, "executor.sock")
+RECORD_PATH = os.environ.get("RECORD_PATH", "")
+DEXSCREENER_URL = os.environ.get("DEXSCREENER_URL", "https://api.dexscreener.com/latest/dex/tokens/")
+RUGCHECK_URL = os.environ.get("RUGCHECK_URL", "https://rugcheck.xyz/api/check/")
+PUMPPORTAL_WS_URL = os.environ.get("PUMPPORTAL_WS_URL", "wss://pumpportal.fun/api/data")
 
 sys.stdout.reconfigure(line_buffering=True)
 sys.stderr.reconfigure(line_buffering=True)
@@ -51,254 +140,1754 @@ sys.stderr.reconfigure(line_buffering=True)
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 logger = logging.getLogger("toxibot")
 
-blacklisted_tokens: Set[str] = set()
-blacklisted_devs: Set[str] = set()
-positions: Dict[str, Dict[str, Any]] = {}
-activity_log: List[str] = []
+# ==== METRICS ====
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, v: float):
+        for i, bound in enumerate(self.bounds):
+            if v <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += v
+        self.count += 1
+
+    def render(self, name: str, labels: str = "") -> List[str]:
+        sep = "," if labels else ""
+        lines, acc = [], 0
+        for bound, n in zip(self.bounds, self.counts):
+            acc += n
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {acc}')
+        lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum:.6f}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+class Metrics:
+    def __init__(self):
+        self.latency: Dict[str, Histogram] = collections.defaultdict(Histogram)
+        self.errors: collections.Counter = collections.Counter()
+        self.unknown: collections.Counter = collections.Counter()
+        self.loop_lag = Histogram(LAG_BUCKETS)
+        self.last_lag = 0.0
+
+    def error(self, upstream: str):
+        self.errors[upstream] += 1
+
+    @contextlib.contextmanager
+    def timed(self, upstream: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.errors[upstream] += 1
+            raise
+        finally:
+            self.latency[upstream].observe(time.perf_counter() - t0)
+
+    async def lag_monitor(self, interval: float = LAG_PROBE_INTERVAL):
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(interval)
+            self.last_lag = max(0.0, loop.time() - t0 - interval)
+            self.loop_lag.observe(self.last_lag)
+
+metrics = Metrics()
+
+def sample_profile(thread_id: int, seconds: float, interval: float = 0.005) -> str:
+    # Runs in a helper thread: samples the event loop thread's stack and reports where it spends time.
+    own: collections.Counter = collections.Counter()
+    total: collections.Counter = collections.Counter()
+    stacks: collections.Counter = collections.Counter()
+    samples = 0
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        frame = sys._current_frames().get(thread_id)
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        if stack:
+            samples += 1
+            own[stack[0]] += 1
+            for fn in set(stack):
+                total[fn] += 1
+            stacks[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    out = [f"# {samples} samples over {seconds}s every {interval * 1000:.0f}ms", "", "# self"]
+    out += [f"{n / max(samples, 1):7.1%}  {fn}" for fn, n in own.most_common(25)]
+    out += ["", "# cumulative"]
+    out += [f"{n / max(samples, 1):7.1%}  {fn}" for fn, n in total.most_common(25)]
+    out += ["", "# collapsed stacks"]
+    out += [f"{st} {n}" for st, n in stacks.most_common(200)]
+    return "\n".join(out) + "\n"
+
+# ==== UPSTREAM POLICY ====
+class UpstreamError(Exception):
+    pass
+
+class Throttled(UpstreamError):
+    def __init__(self, upstream: str, retry_after: float = 0.0):
+        super().__init__(f"{upstream} throttled (retry after {retry_after:.0f}s)")
+        self.retry_after = retry_after
+
+class UpstreamUnavailable(UpstreamError):
+    pass
+
+def check_response(upstream: str, resp):
+    if resp.status == 429:
+        try:
+            retry_after = float(resp.headers.get("Retry-After", 0))
+        except ValueError:
+            retry_after = 0.0
+        raise Throttled(upstream, retry_after)
+    if resp.status >= 400:
+        raise UpstreamError(f"{upstream} HTTP {resp.status}")
+
+class UpstreamPolicy:
+    # Token bucket that halves its rate on 429 and creeps back up on success, a circuit breaker that
+    # fails fast after repeated errors (one probe is let through after the cooldown), and an optional
+    # hedged second request once the first has run past the recent latency quantile.
+    def __init__(self, name: str, rate: float, burst: float, hedge: bool = False):
+        self.name = name
+        self.max_rate = self.rate = rate
+        self.min_rate = rate * UPSTREAM_MIN_RATE_FRAC
+        self.burst = burst
+        self.hedge = hedge
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        self.failures = 0
+        self.open_until = 0.0
+        self._probing = False
+        self.latencies: collections.deque = collections.deque(maxlen=200)
+        self.stats: collections.Counter = collections.Counter()
+
+    @property
+    def state(self) -> str:
+        if not self.open_until:
+            return "closed"
+        return "half_open" if self._probing or time.monotonic() >= self.open_until else "open"
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    async def _take(self):
+        # Reserve a token (the bucket may go into debt) and wait for it, unless the wait is too long.
+        self._refill()
+        wait = (1 - self._tokens) / self.rate if self._tokens < 1 else 0.0
+        if wait > UPSTREAM_MAX_WAIT_S:
+            self.stats["shed"] += 1
+            raise UpstreamUnavailable(f"{self.name}: rate limited locally")
+        self._tokens -= 1
+        if wait:
+            await asyncio.sleep(wait)
+
+    def _admit(self) -> bool:
+        if not self.open_until:
+            return False
+        if self._probing or time.monotonic() < self.open_until:
+            self.stats["short_circuited"] += 1
+            raise UpstreamUnavailable(f"{self.name}: circuit open")
+        self._probing = True
+        return True
+
+    def _ok(self, latency: float):
+        self.failures = 0
+        if self.open_until:
+            logger.info(f"[Upstream] {self.name} recovered, circuit closed")
+            self.open_until = 0.0
+            self._probing = False
+        self.rate = min(self.max_rate, self.rate + self.max_rate * UPSTREAM_RATE_STEP)
+        self.latencies.append(latency)
+
+    def _fail(self, exc: Exception):
+        if isinstance(exc, Throttled):
+            self.stats["throttled"] += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._refill()
+            self._tokens = min(self._tokens, 0.0) - exc.retry_after * self.rate
+        self.failures += 1
+        if self._probing or self.failures >= UPSTREAM_FAIL_THRESHOLD:
+            self.open_until = time.monotonic() + UPSTREAM_COOLDOWN_S
+            self._probing = False
+            self.stats["opened"] += 1
+            logger.warning(f"[Upstream] {self.name} circuit open for {UPSTREAM_COOLDOWN_S}s after {self.failures} failures: {exc}")
+
+    def hedge_delay(self) -> float:
+        if len(self.latencies) < 20:
+            return HEDGE_DEFAULT_S
+        ordered = sorted(self.latencies)
+        return max(HEDGE_MIN_S, ordered[int(HEDGE_QUANTILE * (len(ordered) - 1))])
+
+    async def _attempt(self, fn):
+        t0 = time.perf_counter()
+        try:
+            with metrics.timed(self.name):
+                result = await fn()
+        except Exception as e:
+            self._fail(e)
+            raise
+        self._ok(time.perf_counter() - t0)
+        return result
+
+    async def _hedged(self, fn):
+        first = asyncio.ensure_future(self._attempt(fn))
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay())
+            self._refill()
+            if done or self._tokens < 1:
+                return await first
+            self._tokens -= 1
+            self.stats["hedged"] += 1
+            second = asyncio.ensure_future(self._attempt(fn))
+            tasks.add(second)
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.stats["hedge_won"] += 1
+                        return task.result()
+            return first.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def call(self, fn):
+        probe = self._admit()
+        try:
+            self.stats["calls"] += 1
+            await self._take()
+            if self.hedge and not probe:
+                return await self._hedged(fn)
+            return await self._attempt(fn)
+        finally:
+            if probe and self._probing:
+                self._probing = False
+
+upstreams: Dict[str, UpstreamPolicy] = {
+    name: UpstreamPolicy(name, rate, burst, hedge=name in UPSTREAM_HEDGED) for name, (rate, burst) in UPSTREAM_LIMITS.items()
+}
+
+# ==== POSITION TABLE ====
+PHASES = ("waiting_fill", "filled", "runner", "exited")
+PHASE_CODE = {p: i for i, p in enumerate(PHASES)}
+WAITING_FILL, FILLED, RUNNER, EXITED = range(len(PHASES))
+STRATEGY_OF_SRC = {"pumpfun": "ultra", "moralis": "scalper", "bitquery": "scalper", "community": "community"}
+
+class StrategyBook:
+    COLUMNS = ("entry", "last", "size", "high", "stop", "trail", "pl", "liq_ref", "hold_until", "qty")
+
+    def __init__(self, name: str, capacity: int = 64):
+        self.name = name
+        self.n = 0
+        self.cols: Dict[str, np.ndarray] = {c: np.zeros(capacity) for c in self.COLUMNS}
+        self.cols["phase"] = np.zeros(capacity, dtype=np.int8)
+        self.records: List[Optional["Position"]] = [None] * capacity
+        self.pl_total = 0.0
+
+    def _grow(self):
+        cap = len(self.records) * 2
+        for c, arr in self.cols.items():
+            grown = np.zeros(cap, dtype=arr.dtype)
+            grown[:self.n] = arr[:self.n]
+            self.cols[c] = grown
+        self.records.extend([None] * (cap - len(self.records)))
+
+    def append(self, pos: "Position", values: Dict[str, float]) -> int:
+        if self.n == len(self.records):
+            self._grow()
+        row = self.n
+        for c, arr in self.cols.items():
+            arr[row] = values.get(c, 0)
+        self.records[row] = pos
+        self.pl_total += self.cols["pl"][row]
+        self.n += 1
+        return row
+
+    def remove(self, row: int) -> Dict[str, float]:
+        values = {c: arr[row].item() for c, arr in self.cols.items()}
+        self.pl_total -= values["pl"]
+        last = self.n - 1
+        if row != last:
+            for arr in self.cols.values():
+                arr[row] = arr[last]
+            moved = self.records[last]
+            self.records[row] = moved
+            moved.row = row
+        self.records[last] = None
+        self.n -= 1
+        return values
+
+    def set_pl(self, rows, new_pl):
+        pl = self.cols["pl"]
+        self.pl_total += float(np.sum(new_pl - pl[rows]))
+        pl[rows] = new_pl
+
+def _column(col: str):
+    def get(self):
+        return self.book.cols[col][self.row].item()
+
+    def set(self, v):
+        self.book.cols[col][self.row] = v
+    return property(get, set)
+
+class Position:
+    __slots__ = ("mint", "src", "buy_time", "ml_score", "dev", "book", "row")
+
+    entry_price = _column("entry")
+    last_price = _column("last")
+    size = _column("size")
+    local_high = _column("high")
+    hard_sl = _column("stop")
+    runner_trail = _column("trail")
+    liq_ref = _column("liq_ref")
+    hold_until = _column("hold_until")
+    qty = _column("qty")
+
+    def __init__(self, mint: str, src: str, buy_time: float, ml_score: float = 0.0, dev: Optional[str] = None):
+        self.mint = mint
+        self.src = src
+        self.buy_time = buy_time
+        self.ml_score = ml_score
+        self.dev = dev
+        self.book: Optional[StrategyBook] = None
+        self.row = -1
+
+    @property
+    def strategy(self) -> str:
+        return STRATEGY_OF_SRC.get(self.src, self.src)
+
+    @property
+    def phase(self) -> str:
+        return PHASES[self.book.cols["phase"][self.row]]
+
+    @phase.setter
+    def phase(self, v: str):
+        self.book.cols["phase"][self.row] = PHASE_CODE[v]
+
+    @property
+    def pl(self) -> float:
+        return self.book.cols["pl"][self.row].item()
+
+    @pl.setter
+    def pl(self, v: float):
+        self.book.set_pl(self.row, v)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "src": self.src, "buy_time": self.buy_time, "size": self.size, "ml_score": self.ml_score,
+            "entry_price": self.entry_price, "last_price": self.last_price, "phase": self.phase, "pl": self.pl,
+            "local_high": self.local_high, "hard_sl": self.hard_sl, "runner_trail": self.runner_trail,
+            "liq_ref": self.liq_ref, "hold_until": self.hold_until, "qty": self.qty, "dev": self.dev,
+        }
+
+class PositionTable:
+    def __init__(self):
+        self.books: Dict[str, StrategyBook] = {name: StrategyBook(name) for name in ("ultra", "scalper", "community")}
+        self._by_mint: Dict[str, Position] = {}
+
+    def __contains__(self, mint) -> bool:
+        return mint in self._by_mint
+
+    def __getitem__(self, mint: str) -> Position:
+        return self._by_mint[mint]
+
+    def __iter__(self):
+        return iter(self._by_mint)
+
+    def __len__(self) -> int:
+        return len(self._by_mint)
+
+    def get(self, mint: str, default=None) -> Optional[Position]:
+        return self._by_mint.get(mint, default)
+
+    def items(self):
+        return self._by_mint.items()
+
+    def values(self):
+        return self._by_mint.values()
+
+    def _insert(self, mint: str, rec: Dict[str, Any]) -> Position:
+        entry = rec["entry_price"]
+        pos = Position(mint, rec["src"], rec.get("buy_time", time.time()), rec.get("ml_score", 0.0), rec.get("dev"))
+        book = self.books[pos.strategy]
+        pos.book = book
+        pos.row = book.append(pos, {
+            "entry": entry, "last": rec.get("last_price", entry), "size": rec["size"],
+            "high": rec.get("local_high", entry), "stop": rec["hard_sl"], "trail": rec.get("runner_trail", 0.0),
+            "pl": rec.get("pl", 0.0), "liq_ref": rec.get("liq_ref", 0.0), "hold_until": rec.get("hold_until", 0.0),
+            "qty": rec.get("qty", 0.0),
+            "phase": PHASE_CODE[rec.get("phase", "filled")],
+        })
+        self._by_mint[mint] = pos
+        return pos
+
+    def open(self, mint: str, **rec) -> Position:
+        pos = self._insert(mint, rec)
+        journal.append("pos", mint=mint, rec=pos.to_dict())
+        return pos
+
+    def load(self, records: Dict[str, Dict[str, Any]]):
+        for mint, rec in records.items():
+            self._insert(mint, rec)
+
+    def __delitem__(self, mint: str):
+        pos = self._by_mint.pop(mint)
+        values = pos.book.remove(pos.row)
+        # Detach into a private one-row book so stale references keep reading their last values.
+        pos.book = StrategyBook(pos.book.name, capacity=1)
+        pos.row = pos.book.append(pos, values)
+        journal.append("pos_del", mint=mint)
+
+    def touch(self, mint: str):
+        pos = self._by_mint.get(mint)
+        if pos is not None:
+            journal.append("pos", mint=mint, rec=pos.to_dict())
+
+    @property
+    def open_size(self) -> float:
+        return sum(float(book.cols["size"][:book.n].sum()) for book in self.books.values())
+
+    @property
+    def total_pl(self) -> float:
+        return sum(book.pl_total for book in self.books.values())
+
+    def open_by_strategy(self) -> Dict[str, int]:
+        return {name: book.n for name, book in self.books.items()}
+
+# ==== ACTIVITY EVENTS ====
+class ActivityEvent:
+    __slots__ = ("seq", "ts", "mint", "strategy", "kind", "msg", "nums")
+
+    def __init__(self, seq: int, ts: float, mint: str, strategy: str, kind: str, msg: str, nums: Dict[str, float]):
+        self.seq = seq
+        self.ts = ts
+        self.mint = mint
+        self.strategy = strategy
+        self.kind = kind
+        self.msg = msg
+        self.nums = nums
+
+    def to_json(self) -> str:
+        return json.dumps({"seq": self.seq, "ts": self.ts, "mint": self.mint, "strategy": self.strategy,
+                           "kind": self.kind, "msg": self.msg, **self.nums})
+
+class EventRing:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._buf: List[Optional[ActivityEvent]] = [None] * capacity
+        self.seq = 0
+        self._waiter: Optional[asyncio.Future] = None
+
+    def emit(self, mint: str, strategy: str, kind: str, msg: str = "", **nums: float):
+        self._buf[self.seq % self.capacity] = ActivityEvent(self.seq, time.time(), mint, strategy, kind, msg, nums)
+        self.seq += 1
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def since(self, seq: int) -> List[ActivityEvent]:
+        start = max(seq, self.seq - self.capacity, 0)
+        return [self._buf[i % self.capacity] for i in range(start, self.seq)]
+
+    async def wait(self, seq: int, timeout: Optional[float] = None):
+        if self.seq > seq:
+            return
+        if self._waiter is None or self._waiter.done():
+            self._waiter = asyncio.get_running_loop().create_future()
+        await asyncio.wait_for(asyncio.shield(self._waiter), timeout)
+
+# ==== STATE JOURNAL ====
+class StateJournal:
+    def __init__(self, directory: str):
+        self.journal_path = os.path.join(directory, "journal.log")
+        self.snapshot_path = os.path.join(directory, "snapshot.json")
+        self._buf: List[str] = []
+        self._fh = None
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="journal")
+        self.since_snapshot = 0
+
+    def append(self, op: str, **fields):
+        self._buf.append(json.dumps({"op": op, **fields}, separators=(",", ":")) + "\n")
+
+    def load(self) -> Dict[str, Any]:
+        os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+        state = {"positions": {}, "blacklisted_tokens": [], "blacklisted_devs": [], "exposure": 0.0, "daily_loss": 0.0}
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path) as f:
+                state.update(json.load(f))
+        tokens, devs = set(state["blacklisted_tokens"]), set(state["blacklisted_devs"])
+        replayed = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path) as f:
+                for line in f:
+                    try:
+                        e = json.loads(line)
+                    except ValueError:
+                        break  # torn final write
+                    op = e["op"]
+                    if op == "pos":
+                        state["positions"][e["mint"]] = e["rec"]
+                    elif op == "pos_del":
+                        state["positions"].pop(e["mint"], None)
+                    elif op == "bl_token":
+                        tokens.add(e["v"])
+                    elif op == "bl_dev":
+                        devs.add(e["v"])
+                    elif op == "totals":
+                        state["exposure"], state["daily_loss"] = e["exposure"], e["daily_loss"]
+                    replayed += 1
+        state["blacklisted_tokens"], state["blacklisted_devs"] = tokens, devs
+        self.since_snapshot = replayed
+        self._fh = open(self.journal_path, "a")
+        return state
+
+    def _write(self, data: str):
+        self._fh.write(data)
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+
+    def _compact(self, data: str, state: Dict[str, Any]):
+        if data:
+            self._write(data)
+        tmp = self.snapshot_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+        self._fh.close()
+        self._fh = open(self.journal_path, "w")
+
+    async def flush(self, snapshot: bool = False):
+        if self._fh is None:
+            self._buf.clear()
+            return
+        data, self._buf = "".join(self._buf), []
+        self.since_snapshot += data.count("\n")
+        loop = asyncio.get_running_loop()
+        if snapshot:
+            await loop.run_in_executor(self._io, self._compact, data, capture_state())
+            self.since_snapshot = 0
+        elif data:
+            await loop.run_in_executor(self._io, self._write, data)
+
+    async def run(self):
+        last_snapshot = time.monotonic()
+        while True:
+            await asyncio.sleep(JOURNAL_FLUSH_INTERVAL)
+            due = self.since_snapshot >= JOURNAL_SNAPSHOT_EVERY or time.monotonic() - last_snapshot > JOURNAL_SNAPSHOT_INTERVAL
+            try:
+                await self.flush(snapshot=due)
+            except Exception as e:
+                logger.error(f"Journal write failed: {e}")
+            if due:
+                last_snapshot = time.monotonic()
+
+journal = StateJournal(STATE_DIR)
+
+class JournaledSet(set):
+    def __init__(self, op: str):
+        super().__init__()
+        self.op = op
+
+    def add(self, v):
+        if v not in self:
+            super().add(v)
+            journal.append(self.op, v=v)
+
+blacklisted_tokens: Set[str] = JournaledSet("bl_token")
+blacklisted_devs: Set[str] = JournaledSet("bl_dev")
+positions = PositionTable()
+activity_log = EventRing(EVENT_RING_SIZE)
 exposure: float = 0.0
 daily_loss: float = 0.0
 runtime_status: str = "Starting..."
 current_wallet_balance: float = 0.0
 
+def capture_state() -> Dict[str, Any]:
+    return {
+        "positions": {k: v.to_dict() for k, v in positions.items()},
+        "blacklisted_tokens": list(blacklisted_tokens),
+        "blacklisted_devs": list(blacklisted_devs),
+        "exposure": exposure,
+        "daily_loss": daily_loss,
+    }
+
+def restore_state():
+    global exposure, daily_loss
+    t0 = time.perf_counter()
+    state = journal.load()
+    positions.load(state["positions"])
+    set.update(blacklisted_tokens, state["blacklisted_tokens"])
+    set.update(blacklisted_devs, state["blacklisted_devs"])
+    exposure, daily_loss = state["exposure"], state["daily_loss"]
+    logger.info(f"Restored {len(positions)} positions, {len(blacklisted_tokens)}/{len(blacklisted_devs)} "
+                f"blacklisted tokens/devs in {(time.perf_counter() - t0)*1000:.1f}ms")
+
 # ==== Aggregation for leaderboard, per-bot stats ====
-community_signal_votes = collections.defaultdict(lambda: {"sources": set(), "first_seen": time.time()})
+class VoteAggregator:
+    def __init__(self, window: float = COMM_VOTE_WINDOW_S, min_signals: int = COMM_MIN_SIGNALS):
+        self.window = window
+        self.min_signals = min_signals
+        self.votes: Dict[str, Dict[str, float]] = {}
+        self.promoted: Dict[str, float] = {}
+        self.source_votes: collections.Counter = collections.Counter()
+        self._expiry: List[tuple] = []
+
+    def expire(self, now: float):
+        while self._expiry and self._expiry[0][0] <= now:
+            _, token = heapq.heappop(self._expiry)
+            rec = self.votes.get(token)
+            if rec is not None and max(rec.values()) + self.window <= now:
+                del self.votes[token]
+                self.promoted.pop(token, None)
+
+    def vote(self, token: str, src: str, now: Optional[float] = None):
+        # Returns (live sources, promote) where promote is True at most once per window per mint.
+        now = time.time() if now is None else now
+        self.expire(now)
+        rec = self.votes.setdefault(token, {})
+        rec[src] = now
+        self.source_votes[src] += 1
+        heapq.heappush(self._expiry, (now + self.window, token))
+        live = [s for s, ts in rec.items() if ts > now - self.window]
+        if len(live) >= self.min_signals and now - self.promoted.get(token, -self.window) >= self.window:
+            self.promoted[token] = now
+            return live, True
+        return live, False
+
+community_votes = VoteAggregator()
 community_token_queue = asyncio.Queue()
 
 def get_total_pl():
-    return sum([pos.get("pl", 0) for pos in positions.values()])
+    return positions.total_pl
+
+# ==== RECORDER ====
+SNAPSHOT_FIELDS = ("price", "liq", "base_liq", "vol_1h", "vol_6h", "holders", "max_holder_pct", "buyers", "created_at")
+
+class Recorder:
+    # One JSON object per line: {"t": wall time, "k": kind, "m": mint, ...}. Kinds: feed, dex, rug, tick,
+    # feat (ML feature vector at decision time) and outcome (P/L of a closed position).
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._fh = gzip.open(path, "at") if path.endswith(".gz") else open(path, "a", buffering=1 << 16)
+        self.count = 0
+
+    def write(self, kind: str, mint: str, **fields):
+        self._fh.write(json.dumps({"t": round(time.time(), 3), "k": kind, "m": mint, **fields}, separators=(",", ":")) + "\n")
+        self.count += 1
+
+    def record_dex(self, mint: str, snap: Optional["PairSnapshot"]):
+        self.write("dex", mint, d=None if snap is None else [getattr(snap, f) for f in SNAPSHOT_FIELDS])
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(1)
+            self._fh.flush()
+
+    def close(self):
+        self._fh.close()
+
+recorder: Optional[Recorder] = None
+
+# ==== DEXSCREENER CLIENT ====
+@dataclass(frozen=True, slots=True)
+class PairSnapshot:
+    mint: str
+    price: Optional[float]
+    liq: float
+    base_liq: float
+    vol_1h: float
+    vol_6h: float
+    holders: int
+    max_holder_pct: float
+    buyers: int
+    created_at: Optional[float]
+
+    @property
+    def pool_age(self) -> Optional[float]:
+        if not self.created_at:
+            return None
+        return time.time() - self.created_at
+
+def parse_pair_snapshot(token: str, pairs: List[Dict[str, Any]]) -> Optional[PairSnapshot]:
+    for pair in pairs:
+        if pair.get("baseToken", {}).get("address", "") != token:
+            continue
+        ts = pair.get("createdAtTimestamp") or pair.get("pairCreatedAt")
+        created_at = (int(ts)//1000 if len(str(ts)) > 10 else int(ts)) if ts else None
+        liq = pair.get("liquidity") or {}
+        vol = pair.get("volume") or {}
+        return PairSnapshot(
+            mint=token,
+            price=float(pair["priceNative"]) if "priceNative" in pair else None,
+            liq=float(liq.get("base", 0) or 0),
+            base_liq=float(liq.get("base", 0) or 0),
+            vol_1h=float(vol.get("h1", 0) or 0),
+            vol_6h=float(vol.get("h6", 0) or 0),
+            holders=int(pair.get("holders", 0) or 0),
+            max_holder_pct=float(pair.get("holderConcentration", 0.0) or 0),
+            buyers=int(pair.get("buyTxns", 0) or 0),
+            created_at=created_at,
+        )
+    return None
+
+class DexScreenerClient:
+    def __init__(self, ttl: float = DEX_CACHE_TTL, timeout: float = DEX_TIMEOUT, base_url: str = ""):
+        self.base_url = base_url or DEXSCREENER_URL
+        self.ttl = ttl
+        self.timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._cache: Dict[str, tuple] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.requests = 0
+
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                connector=aiohttp.TCPConnector(limit=DEX_POOL_SIZE, ttl_dns_cache=300, keepalive_timeout=60),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+    def _store(self, token: str, snap: Optional[PairSnapshot]):
+        now = time.monotonic()
+        if len(self._cache) > DEX_CACHE_MAX:
+            self._cache = {k: v for k, v in self._cache.items() if v[0] > now}
+        self._cache[token] = (now + self.ttl, snap)
+
+    def peek(self, token: str) -> Optional[PairSnapshot]:
+        # Last snapshot fetched for the mint, however old; never hits the network.
+        hit = self._cache.get(token)
+        return hit[1] if hit else None
+
+    async def snapshot(self, token: str) -> Optional[PairSnapshot]:
+        # None means DexScreener lists no pair for the mint; a failed lookup raises instead.
+        snaps = await self.snapshots([token])
+        if token not in snaps:
+            raise UpstreamUnavailable(f"dexscreener: no data for {token}")
+        return snaps[token]
+
+    async def snapshots(self, tokens) -> Dict[str, Optional[PairSnapshot]]:
+        now = time.monotonic()
+        out: Dict[str, Optional[PairSnapshot]] = {}
+        pending: Dict[str, asyncio.Future] = {}
+        missing: List[str] = []
+        for token in dict.fromkeys(tokens):
+            hit = self._cache.get(token)
+            if hit and hit[0] > now:
+                self.hits += 1
+                out[token] = hit[1]
+            elif token in self._inflight:
+                pending[token] = self._inflight[token]
+            else:
+                self.misses += 1
+                missing.append(token)
+        for i in range(0, len(missing), DEX_BATCH_SIZE):
+            chunk = missing[i:i + DEX_BATCH_SIZE]
+            fut = asyncio.ensure_future(self._load(chunk))
+            for token in chunk:
+                self._inflight[token] = fut
+                pending[token] = fut
+            fut.add_done_callback(lambda f, chunk=chunk: self._release(chunk, f))
+        if pending:
+            await asyncio.shield(asyncio.gather(*set(pending.values())))
+            for token, fut in pending.items():
+                result = fut.result()
+                if token in result:
+                    out[token] = result[token]
+        return out
+
+    def _release(self, chunk: List[str], fut: asyncio.Future):
+        for token in chunk:
+            if self._inflight.get(token) is fut:
+                del self._inflight[token]
+
+    async def _get(self, url: str):
+        self.requests += 1
+        async with self.session().get(url) as resp:
+            check_response("dexscreener", resp)
+            return await resp.json(content_type=None)
+
+    async def _load(self, chunk: List[str]) -> Dict[str, Optional[PairSnapshot]]:
+        # Tokens missing from the result are unknown (the lookup failed), not absent from DexScreener.
+        url = self.base_url + ",".join(chunk)
+        try:
+            data = await upstreams["dexscreener"].call(lambda: self._get(url))
+            by_mint: Dict[str, List[Dict[str, Any]]] = collections.defaultdict(list)
+            for pair in (data or {}).get("pairs") or []:
+                by_mint[pair.get("baseToken", {}).get("address", "")].append(pair)
+            result = {token: parse_pair_snapshot(token, by_mint.get(token, [])) for token in chunk}
+        except UpstreamUnavailable:
+            return {}
+        except Exception as e:
+            logger.warning(f"DEXScreener fetch error for {len(chunk)} token(s): {e}")
+            return {}
+        for token, snap in result.items():
+            self._store(token, snap)
+            if recorder:
+                recorder.record_dex(token, snap)
+        return result
+
+dex = DexScreenerClient()
 
 # ==== UTILITIES ====
 async def fetch_token_price(token: str) -> Optional[float]:
-    try:
-        url = f"https://api.dexscreener.com/latest/dex/tokens/{token}"
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=6)) as s:
-            resp = await s.get(url)
-            data = await resp.json()
-        for pair in data.get("pairs", [{}]):
-            if pair.get("baseToken", {}).get("address", "") == token and "priceNative" in pair:
-                return float(pair["priceNative"])
-    except Exception as e:
-        logger.warning(f"DEXScreener price error: {e}")
-    return None
+    snap = await dex.snapshot(token)
+    return snap.price if snap else None
 
 async def fetch_pool_age(token: str) -> Optional[float]:
-    try:
-        url = f"https://api.dexscreener.com/latest/dex/tokens/{token}"
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5)) as s:
-            resp = await s.get(url)
-            data = await resp.json()
-        for pair in data.get("pairs", []):
-            if pair.get("baseToken", {}).get("address") == token:
-                ts = pair.get("createdAtTimestamp") or pair.get("pairCreatedAt")
-                if ts:
-                    age_sec = time.time() - (int(ts)//1000 if len(str(ts)) > 10 else int(ts))
-                    return age_sec
-    except Exception:
-        pass
-    return None
+    snap = await dex.snapshot(token)
+    return snap.pool_age if snap else None
 
 async def fetch_volumes(token: str) -> dict:
-    try:
-        url = f"https://api.dexscreener.com/latest/dex/tokens/{token}"
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5)) as s:
-            resp = await s.get(url)
-            data = await resp.json()
-        for pair in data.get("pairs", []):
-            if pair.get("baseToken", {}).get("address") == token:
-                return {
-                    "liq": float(pair.get("liquidity", {}).get("base", 0)),
-                    "vol_1h": float(pair.get("volume", {}).get("h1", 0)),
-                    "vol_6h": float(pair.get("volume", {}).get("h6", 0)),
-                    "base_liq": float(pair.get("liquidity", {}).get("base", 0)),
-                }
-    except Exception:
-        pass
-    return {"liq":0,"vol_1h":0,"vol_6h":0,"base_liq":0}
+    snap = await dex.snapshot(token)
+    if not snap:
+        return {"liq":0,"vol_1h":0,"vol_6h":0,"base_liq":0}
+    return {"liq": snap.liq, "vol_1h": snap.vol_1h, "vol_6h": snap.vol_6h, "base_liq": snap.base_liq}
 
 def estimate_short_vs_long_volume(vol_1h, vol_6h):
     avg_15min = vol_6h / 24 if vol_6h else 0.01
     return vol_1h > 2 * avg_15min if avg_15min else False
 
 async def fetch_holders_and_conc(token: str) -> dict:
-    try:
-        url = f"https://api.dexscreener.com/latest/dex/tokens/{token}"
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=6)) as s:
-            resp = await s.get(url)
-            data = await resp.json()
-        for pair in data.get("pairs", []):
-            if pair.get("baseToken", {}).get("address") == token:
-                holders = int(pair.get("holders", 0) or 0)
-                maxconc = float(pair.get("holderConcentration", 0.0) or 0)
-                return {"holders": holders, "max_holder_pct": maxconc}
-    except Exception:
-        pass
-    return {"holders": 0, "max_holder_pct": 99.}
-
-async def fetch_liquidity_and_buyers(token: str) -> dict:
-    result = {"liq": 0.0, "buyers": 0, "holders": 0}
-    try:
-        url = f"https://api.dexscreener.com/latest/dex/tokens/{token}"
-        async with aiohttp.ClientSession() as s:
-            resp = await s.get(url)
-            data = await resp.json()
-        for pair in data.get("pairs", []):
-            if pair.get("baseToken", {}).get("address", "") == token:
-                result["liq"] = float(pair.get("liquidity", {}).get("base", 0.0))
-                result["buyers"] = int(pair.get("buyTxns", 0) or 0)
-    except Exception as e:
-        logger.warning(f"[UltraEarly] Error fetching liq/buyers/holders: {e}")
-    return result
-
-async def fetch_wallet_balance():
-    if not WALLET_ADDRESS or not HELIUS_API_KEY:
-        return 0.0
-    try:
-        url = f"https://rpc.helius.xyz/?api-key={HELIUS_API_KEY}"
-        req = [{
-            "jsonrpc":"2.0","id":1,"method":"getBalance","params":[WALLET_ADDRESS]
-        }]
-        async with aiohttp.ClientSession() as s:
-            resp = await s.post(url, data=json.dumps(req))
-            res = await resp.json()
-        lamports = res[0].get("result",{}).get("value",0)
-        return lamports/1e9
-    except Exception as e:
-        logger.warning(f"Helius Wallet getBalance error: {e}")
-        return 0.0
+    snap = await dex.snapshot(token)
+    if not snap:
+        return {"holders": 0, "max_holder_pct": 0.0}
+    return {"holders": snap.holders, "max_holder_pct": snap.max_holder_pct}
 
 # ==== FEEDS ====
+class SeenSet:
+    # Mints seen by any feed in the last ttl seconds. Entries are never refreshed, so insertion order
+    # is expiry order and eviction just pops from the front.
+    def __init__(self, ttl: float = FEED_SEEN_TTL_S, maxlen: int = FEED_SEEN_MAX):
+        self.ttl = ttl
+        self.maxlen = maxlen
+        self._expiry: "collections.OrderedDict[str, float]" = collections.OrderedDict()
+
+    def __contains__(self, token: str) -> bool:
+        exp = self._expiry.get(token)
+        return exp is not None and exp > time.time()
+
+    def __len__(self) -> int:
+        return len(self._expiry)
+
+    def add(self, token: str) -> bool:
+        now = time.time()
+        while self._expiry and (len(self._expiry) >= self.maxlen or next(iter(self._expiry.values())) <= now):
+            self._expiry.popitem(last=False)
+        if token in self._expiry:
+            return False
+        self._expiry[token] = now + self.ttl
+        return True
+
+class FeedSupervisor:
+    # Keeps every feed running: a feed function holds one connection (or polling session) and returns or
+    # raises when it ends; the supervisor restarts it after a jittered exponential backoff.
+    def __init__(self):
+        self.seen = SeenSet()
+        self.stats: Dict[str, collections.Counter] = collections.defaultdict(collections.Counter)
+        self._jitter = random.Random()
+
+    async def supervise(self, name: str, feed, *args):
+        failures = 0
+        while True:
+            started = time.monotonic()
+            self.stats[name]["sessions"] += 1
+            try:
+                await feed(*args)
+                logger.warning(f"[Feeds] {name} ended, reconnecting")
+            except Exception as e:
+                self.stats[name]["errors"] += 1
+                logger.warning(f"[Feeds] {name} error: {e}")
+            failures = 0 if time.monotonic() - started > FEED_HEALTHY_S else failures + 1
+            self.stats[name]["reconnects"] += 1
+            cap = min(FEED_BACKOFF_MAX_S, FEED_BACKOFF_BASE_S * 2 ** failures)
+            await asyncio.sleep(self._jitter.uniform(cap / 2, cap))
+
+    async def report(self, interval: float = FEED_REPORT_S):
+        last: Dict[str, collections.Counter] = {}
+        while True:
+            await asyncio.sleep(interval)
+            parts = []
+            for name, st in sorted(self.stats.items()):
+                prev = last.get(name, collections.Counter())
+                parts.append(f"{name} {(st['events'] - prev['events']) / interval:.2f}/s "
+                             f"new={st['new'] - prev['new']} reconnects={st['reconnects']}")
+                last[name] = collections.Counter(st)
+            if parts:
+                logger.info(f"[Feeds] {'; '.join(parts)} seen={len(self.seen)}")
+
+feeds = FeedSupervisor()
+
 async def pumpfun_newtoken_feed(callback):
-    uri = "wss://pumpportal.fun/api/data"
-    try:
-        async with websockets.connect(uri) as ws:
-            payload = {"method": "subscribeNewToken"}
-            await ws.send(json.dumps(payload))
+    # PumpPortal wants one connection per client, so this socket also carries the exit engine's trade
+    # subscriptions; messages are told apart by shape (buy/sell trades vs new-token events).
+    async with websockets.connect(PUMPPORTAL_WS_URL, ping_interval=FEED_PING_S, ping_timeout=FEED_PING_TIMEOUT_S) as ws:
+        await ws.send(json.dumps({"method": "subscribeNewToken"}))
+        exit_engine.attach()
+        try:
             while True:
+                await exit_engine.sync(ws)
                 try:
-                    msg = await ws.recv()
-                    data = json.loads(msg)
-                    token = data.get("params", {}).get("mintAddress") or data.get("params", {}).get("coinAddress")
-                    if token:
-                        await callback(token, "pumpfun")
-                except Exception as e:
-                    logger.warning(f"Pump.fun WS err: {e}, reconnecting in 2s")
-                    await asyncio.sleep(2)
-                    break
-    except Exception as e:
-        logger.error(f"Pump.fun websocket top error: {e}")
+                    msg = await asyncio.wait_for(ws.recv(), EXIT_SYNC_INTERVAL)
+                except asyncio.TimeoutError:
+                    continue
+                data = json_loads(msg)
+                if data.get("txType") in ("buy", "sell"):
+                    await exit_engine.on_trade(data)
+                    continue
+                token = data.get("params", {}).get("mintAddress") or data.get("params", {}).get("coinAddress")
+                if token:
+                    await callback(token, "pumpfun")
+        finally:
+            exit_engine.detach()
 
 async def moralis_trending_feed(callback):
-    api_key = MORALIS_API_KEY
-    if not api_key:
-        logger.warning("Moralis (trending) feed not enabled (no API key).")
-        return
     url = "https://solana-gateway.moralis.io/account/mainnet/trending"
-    while True:
-        try:
-            async with aiohttp.ClientSession() as s:
-                r = await s.get(url, headers={"X-API-Key": api_key})
-                trend = await r.json()
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=15)) as s:
+        while True:
+            with metrics.timed("moralis"):
+                async with s.get(url, headers={"X-API-Key": MORALIS_API_KEY}) as r:
+                    check_response("moralis", r)
+                    trend = json_loads(await r.read())
             for item in trend.get("result", []):
                 if "mint" in item:
                     await callback(item["mint"], "moralis")
-        except Exception as e:
-            logger.error(f"Moralis feed error: {e}")
-        await asyncio.sleep(120)
+            await asyncio.sleep(120)
+
+# Rolling per-mint SOL volume and unique buyers from the Bitquery trade stream. Volume is kept in
+# FLOW_BUCKET_S buckets covering FLOW_LONG_S; buyers only for FLOW_SHORT_S.
+WSOL_MINT = "So11111111111111111111111111111111111111112"
+
+class MintFlow:
+    __slots__ = ("buckets", "buyers", "first", "last", "pushed")
+
+    def __init__(self, now: float):
+        self.buckets: collections.deque = collections.deque()
+        self.buyers: "collections.OrderedDict[str, float]" = collections.OrderedDict()
+        self.first = now
+        self.last = now
+        self.pushed = False
+
+class TradeFlow:
+    def __init__(self, bucket_s: float = FLOW_BUCKET_S, short_s: float = FLOW_SHORT_S, long_s: float = FLOW_LONG_S):
+        self.bucket_s = bucket_s
+        self.short_s = short_s
+        self.long_s = long_s
+        self.mints: Dict[str, MintFlow] = {}
+        self.trades = 0
+
+    def add(self, mint: str, sol: float, buyer: Optional[str], ts: float) -> MintFlow:
+        flow = self.mints.get(mint)
+        if flow is None:
+            flow = self.mints[mint] = MintFlow(ts)
+        start = ts - ts % self.bucket_s
+        if flow.buckets and flow.buckets[-1][0] == start:
+            flow.buckets[-1][1] += sol
+        else:
+            flow.buckets.append([start, sol])
+        if buyer:
+            flow.buyers.pop(buyer, None)
+            flow.buyers[buyer] = ts
+        flow.last = ts
+        self._trim(flow, ts)
+        self.trades += 1
+        if self.trades % FLOW_PRUNE_EVERY == 0:
+            self.prune(ts)
+        return flow
+
+    def prune(self, now: float):
+        for mint in [m for m, f in self.mints.items() if f.last < now - self.long_s]:
+            del self.mints[mint]
+
+    def _trim(self, flow: MintFlow, now: float):
+        # Runs on every trade as well as on reads, so a mint that keeps trading after it was pushed
+        # stays bounded to its windows.
+        while flow.buckets and flow.buckets[0][0] < now - self.long_s:
+            flow.buckets.popleft()
+        while flow.buyers and next(iter(flow.buyers.values())) < now - self.short_s:
+            flow.buyers.popitem(last=False)
+
+    def stats(self, mint: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        flow = self.mints.get(mint)
+        if flow is None:
+            return None
+        now = now or time.time()
+        self._trim(flow, now)
+        vol_short = sum(v for t, v in flow.buckets if t >= now - self.short_s)
+        vol_long = sum(v for _, v in flow.buckets)
+        # Rate over the part of the long window we have actually observed, so young mints are not diluted.
+        long_span = max(self.short_s, min(self.long_s, now - flow.first))
+        surge = vol_short / self.short_s > FLOW_SURGE_X * vol_long / long_span if long_span > self.short_s else vol_short > 0
+        return {"vol_short": vol_short, "vol_long": vol_long, "buyers": len(flow.buyers), "surge": surge}
+
+    def crossed(self, mint: str, now: Optional[float] = None) -> bool:
+        flow = self.mints.get(mint)
+        if flow is None or flow.pushed:
+            return False
+        st = self.stats(mint, now)
+        if st["vol_short"] >= FLOW_MIN_VOL_SOL and st["buyers"] >= FLOW_MIN_BUYERS and st["surge"]:
+            flow.pushed = True
+            return True
+        return False
+
+trade_flow = TradeFlow()
+
+async def fetch_flow(token: str) -> Optional[Dict[str, Any]]:
+    flow = trade_flow.stats(token)
+    if recorder:
+        recorder.write("flow", token, d=flow)  # replay has no Bitquery stream; the gate reads these back
+    return flow
+
+def has_volume_surge(flow: Optional[Dict[str, Any]], volumes: Dict[str, Any]) -> bool:
+    if flow is not None:
+        return flow["surge"]
+    return estimate_short_vs_long_volume(volumes["vol_1h"], volumes["vol_6h"])
+
+BITQUERY_SUBSCRIPTION = """
+subscription {
+  Solana {
+    DEXTrades(where: {Transaction: {Result: {Success: true}}, any: [
+      {Trade: {Buy: {Currency: {MintAddress: {is: "%s"}}}}},
+      {Trade: {Sell: {Currency: {MintAddress: {is: "%s"}}}}}]}) {
+      Trade {
+        Buy { Amount Account { Address } Currency { MintAddress } }
+        Sell { Amount Account { Address } Currency { MintAddress } }
+      }
+    }
+  }
+}
+""" % (WSOL_MINT, WSOL_MINT)
+
+def parse_dex_trade(trade: Dict[str, Any]) -> Optional[tuple]:
+    # -> (mint, sol volume, buyer or None); only trades against SOL count.
+    buy, sell = trade["Trade"]["Buy"], trade["Trade"]["Sell"]
+    buy_mint, sell_mint = buy["Currency"]["MintAddress"], sell["Currency"]["MintAddress"]
+    if sell_mint == WSOL_MINT and buy_mint != WSOL_MINT:
+        return buy_mint, float(sell["Amount"] or 0), (buy.get("Account") or {}).get("Address")
+    if buy_mint == WSOL_MINT and sell_mint != WSOL_MINT:
+        return sell_mint, float(buy["Amount"] or 0), None
+    return None
 
 async def bitquery_trending_feed(callback):
-    api_key = BITQUERY_API_KEY
-    if not api_key:
+    # graphql-transport-ws subscription to every successful SOL-pair DEX trade on Solana.
+    async with websockets.connect(f"{BITQUERY_WS_URL}?token={BITQUERY_API_KEY}", subprotocols=["graphql-transport-ws"],
+                                  ping_interval=FEED_PING_S, ping_timeout=FEED_PING_TIMEOUT_S) as ws:
+        await ws.send(json.dumps({"type": "connection_init"}))
+        async for raw in ws:
+            msg = json_loads(raw)
+            kind = msg.get("type")
+            if kind == "connection_ack":
+                await ws.send(json.dumps({"id": "1", "type": "subscribe", "payload": {"query": BITQUERY_SUBSCRIPTION}}))
+                logger.info("[Bitquery] DEXTrades subscription started")
+            elif kind == "ping":
+                await ws.send(json.dumps({"type": "pong"}))
+            elif kind in ("error", "complete", "connection_error"):
+                metrics.error("bitquery")
+                raise UpstreamError(f"Bitquery subscription {kind}: {str(msg.get('payload'))[:200]}")
+            elif kind == "next":
+                now = time.time()
+                touched = set()
+                for trade in ((msg.get("payload") or {}).get("data") or {}).get("Solana", {}).get("DEXTrades") or []:
+                    parsed = parse_dex_trade(trade)
+                    if parsed:
+                        trade_flow.add(parsed[0], parsed[1], parsed[2], now)
+                        touched.add(parsed[0])
+                for mint in touched:
+                    if trade_flow.crossed(mint, now):
+                        await callback(mint, "bitquery")
+
+def enabled_feeds() -> Dict[str, Any]:
+    sources = {"pumpfun": pumpfun_newtoken_feed}
+    if MORALIS_API_KEY:
+        sources["moralis"] = moralis_trending_feed
+    else:
+        logger.warning("Moralis (trending) feed not enabled (no API key).")
+    if BITQUERY_API_KEY:
+        sources["bitquery"] = bitquery_trending_feed
+    else:
         logger.warning("Bitquery trending feed not enabled (no OAuth token).")
-        return
-    url = "https://streaming.bitquery.io/graphql"
-    q = {"query": "... {Solana{DEXTrades(limit:10){baseCurrency{address}}}}"}
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
-    while True:
-        try:
-            logger.info(f"Using Bitquery key: {api_key[:8]}... (len={len(api_key)})")
-            logger.info(f"Headers: {headers}")
-            async with aiohttp.ClientSession() as s:
-                async with s.post(url, json=q, headers=headers) as r:
-                    logger.info(f"Bitquery HTTP status: {r.status}")
-                    if r.status != 200:
-                        text = await r.text()
-                        logger.error(f"Bitquery HTTP error: {r.status}, text: {text}")
-                        await asyncio.sleep(180)
-                        continue
-                    try:
-                        data = await r.json()
-                    except Exception:
-                        text = await r.text()
-                        logger.error(f"Bitquery non-JSON response: {text}")
-                        await asyncio.sleep(180)
-                        continue
-            logger.info(f"Bitquery received JSON: {data}")
-            if not data or "data" not in data or "Solana" not in data["data"]:
-                logger.error(f"Bitquery response missing 'data'/'Solana': {data}")
-                await asyncio.sleep(180)
-                continue
-            for trade in data["data"]["Solana"].get("DEXTrades", []):
-                addr = trade.get("baseCurrency", {}).get("address", "")
-                if addr:
-                    await callback(addr, "bitquery")
-        except Exception as e:
-            logger.error(f"Bitquery feed error: {e}")
-        await asyncio.sleep(180)
+    return sources
 
 # COMMUNITY PERSONALITY VOTE AGGREGATOR
 async def community_candidate_callback(token, src):
-    now = time.time()
     if src and token:
-        rec = community_signal_votes[token]
-        rec["sources"].add(src)
-        if "first_seen" not in rec:
-            rec["first_seen"] = now
-        voted = len(rec["sources"])
-        logger.info(f"[CommunityBot] {token} in {rec['sources']} ({voted}/{COMM_MIN_SIGNALS})")
-        if voted >= COMM_MIN_SIGNALS:
+        live, promote = community_votes.vote(token, src)
+        logger.info(f"[CommunityBot] {token} in {live} ({len(live)}/{COMM_MIN_SIGNALS})")
+        if promote:
             await community_token_queue.put(token)
 
 # ==== TOXIBOT/TELEGRAM ====
 class ToxiBotClient:
-    def __init__(self, api_id, api_hash, session_id, username):
-        self._client = TelegramClient(StringSession(session_id), api_id, api_hash, connection_retries=5)
+    def __init__(self, api_id, api_hash, session_id, username, client=None):
+        self._client = client or TelegramClient(StringSession(session_id), api_id, api_hash, connection_retries=5)
         self.bot_username = username
 
     async def connect(self):
         await self._client.start()
         logger.info("Connected to ToxiBot (Telegram).")
 
-    async def send_buy(self, mint: str, amount: float, price_limit=None):
+    def on_reply(self, callback):
+        async def handler(event):
+            callback(event.raw_text or "")
+        self._client.add_event_handler(handler, events.NewMessage(chats=self.bot_username, incoming=True))
+
+    @staticmethod
+    def buy_command(mint: str, amount: float, price_limit=None) -> str:
         cmd = f"/buy {mint} {amount}".strip()
         if price_limit:
             cmd += f" limit {price_limit:.7f}"
+        return cmd
+
+    @staticmethod
+    def sell_command(mint: str, perc: int = 100) -> str:
+        return f"/sell {mint} {perc}%"
+
+    @staticmethod
+    def cancel_command(mint: str) -> str:
+        return f"/cancel {mint}"
+
+    async def send_command(self, cmd: str):
         logger.info(f"Sending to ToxiBot: {cmd}")
         return await self._client.send_message(self.bot_username, cmd)
 
+    async def send_buy(self, mint: str, amount: float, price_limit=None):
+        return await self.send_command(self.buy_command(mint, amount, price_limit))
+
     async def send_sell(self, mint: str, perc: int = 100):
-        cmd = f"/sell {mint} {perc}%"
-        logger.info(f"Sending to ToxiBot: {cmd}")
-        return await self._client.send_message(self.bot_username, cmd)
+        return await self.send_command(self.sell_command(mint, perc))
 
-# ==== RUGCHECK & ML ====
-async def rugcheck(token_addr: str) -> Dict[str, Any]:
-    url = f"https://rugcheck.xyz/api/check/{token_addr}"
+# ==== ORDER DISPATCHER ====
+PRIO_STOP, PRIO_SELL, PRIO_BUY = 0, 1, 2
+
+class Order:
+    __slots__ = ("mint", "side", "prio", "amount", "price_limit", "pct", "queued_at", "sent_at", "acked_at", "future")
+
+    def __init__(self, mint: str, side: str, prio: int, amount: float = 0.0, price_limit=None, pct: int = 100):
+        self.mint = mint
+        self.side = side
+        self.prio = prio
+        self.amount = amount
+        self.price_limit = price_limit
+        self.pct = pct
+        self.queued_at = time.time()
+        self.sent_at = 0.0
+        self.acked_at = 0.0
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def command(self) -> str:
+        if self.side == "buy":
+            return ToxiBotClient.buy_command(self.mint, self.amount, self.price_limit)
+        if self.side == "cancel":
+            return ToxiBotClient.cancel_command(self.mint)
+        return ToxiBotClient.sell_command(self.mint, self.pct)
+
+class OrderDispatcher:
+    # Sits in front of ToxiBotClient with the same send_buy/send_sell interface. Sends never block the
+    # caller: orders go on a priority heap (stops, then sells, then buys) drained at Telegram's rate.
+    def __init__(self, client: ToxiBotClient, rate: float = TG_RATE_PER_S, burst: float = TG_BURST):
+        self.client = client
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._refilled = time.monotonic()
+        self._heap: List[tuple] = []
+        self._seq = 0
+        self._pending: Dict[tuple, Order] = {}
+        self._wake = asyncio.Event()
+        self.sent: collections.Counter = collections.Counter()
+        self.collapsed = 0
+        self.flood_waits = 0
+        self.last_sent: Optional[Order] = None
+        self.failed = 0
+        self.queue_latency: collections.deque = collections.deque(maxlen=1000)
+        self.send_latency: collections.deque = collections.deque(maxlen=1000)
+
+    async def connect(self):
+        await self.client.connect()
+
+    def on_reply(self, callback):
+        self.client.on_reply(callback)
+
+    def depth(self) -> int:
+        return len(self._pending)
+
+    def _push(self, order: Order):
+        self._seq += 1
+        heapq.heappush(self._heap, (order.prio, self._seq, order))
+        self._wake.set()
+
+    def submit(self, order: Order) -> Order:
+        # Only an order still waiting in the queue absorbs a duplicate; one already being sent has its
+        # command built, so the newer order (e.g. a stop behind a take-profit) is queued on its own.
+        key = (order.mint, order.side)
+        queued = self._pending.get(key)
+        if queued is not None and not queued.sent_at:
+            self.collapsed += 1
+            if order.side == "sell":
+                queued.pct = max(queued.pct, order.pct)
+                if order.prio < queued.prio:
+                    queued.prio = order.prio
+                    self._push(queued)
+            return queued
+        self._pending[key] = order
+        self._push(order)
+        return order
+
+    async def send_buy(self, mint: str, amount: float, price_limit=None) -> Order:
+        return self.submit(Order(mint, "buy", PRIO_BUY, amount=amount, price_limit=price_limit))
+
+    async def send_sell(self, mint: str, perc: int = 100, stop: bool = False) -> Order:
+        return self.submit(Order(mint, "sell", PRIO_STOP if stop else PRIO_SELL, pct=perc))
+
+    async def cancel(self, mint: str) -> Optional[Order]:
+        # A buy still sitting in the queue is simply dropped; one already sent needs a cancel command.
+        queued = self._pending.get((mint, "buy"))
+        if queued is not None and not queued.sent_at:
+            del self._pending[(mint, "buy")]
+            queued.future.cancel()
+            return None
+        return self.submit(Order(mint, "cancel", PRIO_SELL))
+
+    def _done(self, order: Order):
+        key = (order.mint, order.side)
+        if self._pending.get(key) is order:
+            del self._pending[key]
+
+    async def _next(self) -> Order:
+        while True:
+            while self._heap:
+                prio, _, order = heapq.heappop(self._heap)
+                if prio == order.prio and self._pending.get((order.mint, order.side)) is order:
+                    return order
+            self._wake.clear()
+            await self._wake.wait()
+
+    async def _take_token(self):
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+            self._refilled = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    async def run(self):
+        while True:
+            order = await self._next()
+            await self._take_token()
+            order.sent_at = time.time()
+            self.last_sent = order
+            try:
+                result = await self.client.send_command(order.command())
+            except FloodWaitError as e:
+                self.flood_waits += 1
+                self._tokens = 0
+                logger.warning(f"Telegram FloodWait {e.seconds}s; holding {self.depth()} queued orders")
+                order.sent_at = 0.0
+                if self._pending.get((order.mint, order.side)) is order:
+                    self._push(order)
+                elif self.submit(order) is not order:
+                    order.future.cancel()  # merged into the newer order queued while this one was sending
+                await asyncio.sleep(e.seconds)
+                continue
+            except Exception as e:
+                self.failed += 1
+                self._done(order)
+                logger.error(f"ToxiBot {order.side} for {order.mint} failed: {e}")
+                order.future.set_exception(e)
+                order.future.exception()  # mark retrieved; callers rarely await orders
+                continue
+            order.acked_at = time.time()
+            self._done(order)
+            self.sent[order.side] += 1
+            self.queue_latency.append(order.sent_at - order.queued_at)
+            self.send_latency.append(order.acked_at - order.sent_at)
+            order.future.set_result(result)
+
+toxibot: Optional[OrderDispatcher] = None
+
+# ==== FILL CONFIRMATION ====
+# ToxiBot answers every command in the chat; these patterns pull the outcome and the executed
+# amounts out of a reply. Replies that name no mint are matched only to the last command sent, and
+# only if that was a buy. The token quantity counts only when a token unit follows it, never SOL.
+REPLY_MINT_RE = re.compile(r"\b[1-9A-HJ-NP-Za-km-z]{32,44}\b")
+REPLY_CANCEL_RE = re.compile(r"(?<!/)\bcancel(?:l?ed)?\b", re.I)
+REPLY_FAIL_RE = re.compile(r"\b(fail(?:ed|ure)?|error|insufficient|expired|slippage exceeded)\b", re.I)
+REPLY_BUY_RE = re.compile(r"\b(bought|buy (?:success|successful|executed|filled|confirmed)|limit (?:order )?filled)\b", re.I)
+REPLY_SIDE_RE = re.compile(r"(?<!/)\b(buy|bought|sell|sold)\b", re.I)  # "/sell" in a hint is not a side
+REPLY_SOL_RE = re.compile(r"([\d,]*\.?\d+)\s*SOL\b", re.I)
+REPLY_TOKENS_RE = re.compile(r"(?i:bought|received|got)\s+([\d,]*\.?\d+)\s*(?!SOL\b)((?i:tokens?)\b|\$?[A-Z][A-Z0-9]{1,9}\b)")
+
+def parse_reply(text: str) -> Optional[Dict[str, Any]]:
+    if REPLY_CANCEL_RE.search(text):
+        status = "cancelled"
+    elif REPLY_FAIL_RE.search(text):
+        status = "failed"
+    elif REPLY_BUY_RE.search(text):
+        status = "filled"
+    else:
+        return None
+    sides = {m.lower() for m in REPLY_SIDE_RE.findall(text)}
+    if status != "cancelled" and sides & {"sell", "sold"} and not sides & {"buy", "bought"}:
+        return None  # outcome of a sell; exits do not wait for those
+    mint = REPLY_MINT_RE.search(text)
+    sol, tokens = REPLY_SOL_RE.search(text), REPLY_TOKENS_RE.search(text)
+    sol = float(sol.group(1).replace(",", "")) if sol else None
+    tokens = float(tokens.group(1).replace(",", "")) if tokens else None
+    return {"status": status, "mint": mint.group(0) if mint else None, "sol": sol,
+            "price": sol / tokens if sol and tokens else None}
+
+class PendingFill:
+    __slots__ = ("mint", "limit", "order", "since", "settling")
+
+    def __init__(self, mint: str, limit: bool, order: Optional[Order]):
+        self.mint = mint
+        self.limit = limit
+        self.order = order
+        self.since = time.time()
+        self.settling = False
+
+class FillTracker:
+    # Positions open in waiting_fill and take no exit actions until ToxiBot confirms the buy. A limit
+    # nobody confirms is cancelled after its timeout. An unconfirmed market buy is never booked at the
+    # quote taken before it was sent: the on-chain balance settles it when the wallet tracker is live,
+    # otherwise a fresh quote does, and it is dropped after twice the timeout with neither.
+    def __init__(self, market_timeout: float = FILL_TIMEOUT_MARKET_S, limit_timeout: float = FILL_TIMEOUT_LIMIT_S):
+        self.market_timeout = market_timeout
+        self.limit_timeout = limit_timeout
+        self.pending: Dict[str, PendingFill] = {}
+        self.cancelling: Dict[str, float] = {}  # mints we sent /cancel for, until ToxiBot acknowledges
+        self.stats: collections.Counter = collections.Counter()
+        self.fill_latency: collections.deque = collections.deque(maxlen=1000)
+
+    def expect(self, mint: str, order: Optional[Order] = None, limit: bool = False):
+        self.pending[mint] = PendingFill(mint, limit, order if isinstance(order, Order) else None)
+
+    def on_reply(self, text: str):
+        reply = parse_reply(text)
+        if reply is None:
+            return
+        mint, status = reply["mint"], reply["status"]
+        if mint is None:
+            last = toxibot.last_sent if isinstance(toxibot, OrderDispatcher) else None
+            sides = ("buy", "cancel") if status == "cancelled" else ("buy",)
+            mint = last.mint if last is not None and last.side in sides else None
+        if status == "cancelled" and self.cancelling.pop(mint, None) is not None:
+            return  # acknowledgement of our own /cancel; expire() already rejected that buy
+        if mint not in self.pending:
+            return
+        if status == "filled":
+            self.confirm(mint, reply["price"], reply["sol"])
+        else:
+            self.reject(mint, f"ToxiBot: {text.strip()[:120]}")
+
+    def confirm(self, mint: str, price: Optional[float] = None, size: Optional[float] = None, assumed: bool = False):
+        pending = self.pending.pop(mint, None)
+        pos = positions.get(mint)
+        if pos is None or pos.phase != "waiting_fill":
+            return
+        if price:
+            stop_ratio = pos.hard_sl / pos.entry_price if pos.entry_price else 0
+            pos.entry_price = pos.last_price = pos.local_high = price
+            pos.hard_sl = price * stop_ratio
+        if size:
+            pos.size = size
+        pos.phase = "filled"
+        positions.touch(mint)
+        self.stats["assumed" if assumed else "confirmed"] += 1
+        if pending is not None and pending.order and pending.order.sent_at:
+            self.fill_latency.append(time.time() - pending.order.sent_at)
+        activity_log.emit(mint, pos.strategy, "fill",
+                          f"Fill {'assumed (no reply)' if assumed else 'confirmed'}: {pos.size} @ {pos.entry_price:.7f}",
+                          price=pos.entry_price, size=pos.size)
+
+    def reject(self, mint: str, reason: str):
+        self.pending.pop(mint, None)
+        pos = positions.get(mint)
+        if pos is None or pos.phase != "waiting_fill":
+            return
+        del positions[mint]
+        self.stats["unfilled"] += 1
+        activity_log.emit(mint, pos.strategy, "unfilled", f"Buy not filled: {reason}")
+
+    async def settle_market(self, mint: str, p: PendingFill, waited: float):
+        pos = positions.get(mint)
+        if pos is None:
+            self.pending.pop(mint, None)
+            return
+        if wallet.live:
+            held = wallet.holdings.get(mint)
+            if held:
+                self.confirm(mint, price=pos.size / held, assumed=True)
+                return
+            if not p.settling:
+                wallet.request_reconcile()
+        else:
+            try:
+                price = await fetch_token_price(mint)
+            except UpstreamError as e:
+                logger.warning(f"Re-quote for unconfirmed buy of {mint} failed: {e}")
+                price = None
+            if price:
+                self.confirm(mint, price, assumed=True)
+                return
+        p.settling = True
+        if waited >= 2 * self.market_timeout:
+            self.reject(mint, "no reply and no tokens on-chain" if wallet.live else "no reply and no quote")
+
+    async def expire(self, now: float):
+        for mint, since in list(self.cancelling.items()):
+            if now - since > self.limit_timeout:
+                del self.cancelling[mint]
+        for mint, p in list(self.pending.items()):
+            order = p.order
+            if order is not None and order.future.done() and not order.future.cancelled() and order.future.exception():
+                self.reject(mint, f"send failed: {order.future.exception()}")
+                continue
+            started = (order.sent_at if order is not None else p.since) or now
+            if now - started < (self.limit_timeout if p.limit else self.market_timeout):
+                continue
+            if p.limit:
+                self.cancelling[mint] = now
+                await toxibot.cancel(mint)
+                self.reject(mint, "limit timed out, cancelled")
+            else:
+                await self.settle_market(mint, p, now - started)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(1)
+            try:
+                await self.expire(time.time())
+            except Exception as e:
+                logger.error(f"Fill tracker error: {e}")
+
+fills = FillTracker()
+
+# ==== WALLET TRACKER ====
+def parse_token_account(data) -> Optional[tuple]:
+    # jsonParsed SPL token account -> (mint, ui amount); closed or unparsed accounts give None.
     try:
+        info = data["parsed"]["info"]
+        return info["mint"], float(info["tokenAmount"].get("uiAmount") or 0)
+    except (TypeError, KeyError, ValueError):
+        return None
+
+class WalletTracker:
+    # The SOL balance and the token accounts behind open positions are pushed over a Helius
+    # accountSubscribe websocket. One batched JSON-RPC call (getBalance + getTokenAccountsByOwner)
+    # reconciles at startup, after reconnects, and whenever an open position has no token account yet;
+    # it also drops subscriptions for accounts whose position has closed.
+    def __init__(self, owner: str, rpc_url: str, ws_url: str):
+        self.owner = owner
+        self.rpc_url = rpc_url
+        self.ws_url = ws_url
+        self.balance: Optional[float] = None
+        self.accounts: Dict[str, str] = {}
+        self.holdings: Dict[str, float] = {}
+        self.subs: Dict[int, str] = {}
+        self.watching: Set[str] = set()
+        self._requests: Dict[int, str] = {}
+        self._ws = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._ids = 0
+        self._reconcile = asyncio.Event()
+        self.stats: collections.Counter = collections.Counter()
+
+    def _id(self) -> int:
+        self._ids += 1
+        return self._ids
+
+    @property
+    def live(self) -> bool:
+        return self._ws is not None
+
+    def request_reconcile(self):
+        self._reconcile.set()
+
+    async def rpc_batch(self, calls: List[tuple]) -> List[Any]:
+        body = [{"jsonrpc": "2.0", "id": i, "method": m, "params": p} for i, (m, p) in enumerate(calls)]
+
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+
+        async def post():
+            async with self._session.post(self.rpc_url, json=body) as resp:
+                check_response("helius", resp)
+                return await resp.json()
+        replies = {r.get("id"): r for r in await upstreams["helius"].call(post)}
+        return [replies.get(i, {}).get("result") for i in range(len(calls))]
+
+    async def reconcile(self):
+        self.stats["reconciles"] += 1
+        calls = [("getBalance", [self.owner])] + [
+            ("getTokenAccountsByOwner", [self.owner, {"programId": p}, {"encoding": "jsonParsed"}]) for p in TOKEN_PROGRAMS]
+        balance, *token_lists = await self.rpc_batch(calls)
+        if balance is not None:
+            self._on_balance(balance["value"])
+        for result in token_lists:
+            for acct in (result or {}).get("value", []):
+                parsed = parse_token_account(acct["account"]["data"])
+                if parsed:
+                    self.accounts[acct["pubkey"]] = parsed[0]
+                    self._on_token(*parsed)
+        await self._sync_subscriptions()
+
+    async def _sync_subscriptions(self):
+        # Dust and long-closed tokens in the wallet stay unsubscribed; reconcile still sees them.
+        wanted = {pubkey for pubkey, mint in self.accounts.items() if mint in positions}
+        for pubkey in wanted - self.watching:
+            await self._subscribe(pubkey)
+        for pubkey in (self.watching | set(self.subs.values())) - wanted - {self.owner}:
+            await self._unsubscribe(pubkey)
+
+    def _missing_accounts(self) -> bool:
+        return any(mint not in self.holdings for mint in positions)
+
+    def _on_balance(self, lamports: int):
+        global current_wallet_balance
+        previous, self.balance = self.balance, lamports / 1e9
+        current_wallet_balance = self.balance
+        if previous is not None and previous != self.balance and self._missing_accounts():
+            self._reconcile.set()
+
+    def _on_token(self, mint: str, amount: float):
+        # Once filled, size follows the chain: held tokens valued at the entry price, so partial fills,
+        # our own partial sells and anything sold outside the bot all show up in P/L, exposure and exits.
+        previous = self.holdings.get(mint, 0.0)
+        self.holdings[mint] = amount
+        pos = positions.get(mint)
+        if pos is None or amount == previous and pos.qty == amount:
+            return
+        pos.qty = amount
+        if amount > 0 and pos.phase == "waiting_fill":
+            fills.confirm(mint, price=pos.size / amount)
+        elif amount > 0 and pos.phase != "exited" and pos.entry_price:
+            pos.size = amount * pos.entry_price
+        elif amount == 0 and previous > 0 and pos.size:
+            pos.size = 0
+            pos.phase = "exited"
+            activity_log.emit(mint, pos.strategy, "exit", "Token balance went to zero on-chain; position closed.")
+        positions.touch(mint)
+
+    async def _subscribe(self, pubkey: str):
+        if self._ws is None:
+            return
+        self.watching.add(pubkey)
+        req_id = self._id()
+        self._requests[req_id] = pubkey
+        await self._ws.send(json.dumps({"jsonrpc": "2.0", "id": req_id, "method": "accountSubscribe",
+                                        "params": [pubkey, {"encoding": "jsonParsed", "commitment": "confirmed"}]}))
+
+    async def _unsubscribe(self, pubkey: str):
+        self.watching.discard(pubkey)
+        for sub_id in [i for i, p in self.subs.items() if p == pubkey]:
+            del self.subs[sub_id]
+            if self._ws is not None:
+                await self._ws.send(json.dumps({"jsonrpc": "2.0", "id": self._id(), "method": "accountUnsubscribe",
+                                                "params": [sub_id]}))
+
+    def _on_message(self, msg: Dict[str, Any]):
+        if "id" in msg and msg["id"] in self._requests:
+            pubkey = self._requests.pop(msg["id"])
+            if "result" in msg:
+                self.subs[msg["result"]] = pubkey
+            else:
+                logger.warning(f"[Wallet] accountSubscribe failed for {pubkey}: {msg.get('error')}")
+            return
+        if msg.get("method") != "accountNotification":
+            return
+        self.stats["notifications"] += 1
+        params = msg["params"]
+        pubkey = self.subs.get(params["subscription"])
+        value = params["result"]["value"]
+        if pubkey == self.owner:
+            self._on_balance(value["lamports"])
+        elif pubkey in self.accounts:
+            parsed = parse_token_account(value.get("data")) if value else None
+            self._on_token(self.accounts[pubkey], parsed[1] if parsed else 0.0)
+
+    async def _reconciler(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._reconcile.wait(), WALLET_RECONCILE_S)
+                await asyncio.sleep(WALLET_RECONCILE_DEBOUNCE_S)
+            except asyncio.TimeoutError:
+                pass
+            self._reconcile.clear()
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.warning(f"[Wallet] reconcile failed: {e}")
+
+    async def run(self):
+        if not (self.owner and self.rpc_url and self.ws_url):
+            logger.warning("Wallet tracking not enabled (needs WALLET_ADDRESS and Helius RPC/websocket URLs).")
+            return
+        reconciler = asyncio.ensure_future(self._reconciler())
+        try:
+            while True:
+                try:
+                    async with websockets.connect(self.ws_url, ping_interval=20) as ws:
+                        self._ws = ws
+                        self.subs.clear()
+                        self._requests.clear()
+                        self.watching.clear()
+                        await self._subscribe(self.owner)
+                        await self._sync_subscriptions()
+                        self._reconcile.set()
+                        async for raw in ws:
+                            self._on_message(json_loads(raw))
+                except Exception as e:
+                    self.stats["reconnects"] += 1
+                    logger.warning(f"[Wallet] Helius websocket error: {e}, reconnecting in 2s")
+                finally:
+                    self._ws = None
+                await asyncio.sleep(2)
+        finally:
+            reconciler.cancel()
+            if self._session is not None:
+                await self._session.close()
+
+wallet = WalletTracker(WALLET_ADDRESS, HELIUS_RPC_URL, HELIUS_WS_URL)
+
+# ==== RUGCHECK VERDICT CACHE ====
+RUG_FIELDS = ("label", "supply_type", "mint", "authority", "max_holder_pct")
+
+class RugVerdictCache:
+    def __init__(self, path: str):
+        self.path = path
+        self._mem: Dict[str, tuple] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rugcache")
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _open(self) -> int:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS verdicts (mint TEXT PRIMARY KEY, kind TEXT, payload TEXT, expires_at REAL)")
+        now = time.time()
+        self._db.execute("DELETE FROM verdicts WHERE expires_at < ?", (now,))
+        self._db.commit()
+        for mint, kind, payload, expires_at in self._db.execute("SELECT mint, kind, payload, expires_at FROM verdicts"):
+            self._mem[mint] = (expires_at, json.loads(payload), kind)
+        return len(self._mem)
+
+    async def warm(self):
+        try:
+            n = await asyncio.get_running_loop().run_in_executor(self._io, self._open)
+            logger.info(f"Rugcheck cache warmed with {n} verdicts from {self.path}")
+        except Exception as e:
+            logger.error(f"Rugcheck cache unavailable ({self.path}): {e}")
+
+    def _write(self, mint: str, kind: str, payload: str, expires_at: float):
+        try:
+            self._db.execute("INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?)", (mint, kind, payload, expires_at))
+            self._db.commit()
+        except Exception as e:
+            logger.warning(f"Rugcheck cache write failed for {mint}: {e}")
+
+    def get(self, mint: str) -> Optional[Dict[str, Any]]:
+        hit = self._mem.get(mint)
+        if hit and hit[0] > time.time() and hit[2] != "error":
+            self.hits += 1
+            return hit[1]
+        self.misses += 1
+        return None
+
+    def put(self, mint: str, data: Dict[str, Any]):
+        if not data:
+            kind, ttl = "error", RUG_TTL_ERROR
+        elif data.get("label") == "Good":
+            kind, ttl = "good", RUG_TTL_GOOD
+        else:
+            kind, ttl = "bad", RUG_TTL_BAD
+        now = time.time()
+        if len(self._mem) > RUG_CACHE_MAX:
+            self._mem = {k: v for k, v in self._mem.items() if v[0] > now}
+        verdict = {k: data[k] for k in RUG_FIELDS if k in data}
+        self._mem[mint] = (now + ttl, verdict, kind)
+        if self._db is not None:
+            self._io.submit(self._write, mint, kind, json.dumps(verdict), now + ttl)
+
+    def failed_recently(self, mint: str) -> bool:
+        hit = self._mem.get(mint)
+        return bool(hit and hit[2] == "error" and hit[0] > time.time())
+
+    def peek(self, mint: str) -> Optional[Dict[str, Any]]:
+        hit = self._mem.get(mint)
+        return hit[1] if hit and hit[2] != "error" else None
+
+    def is_rejected(self, mint: str) -> bool:
+        hit = self._mem.get(mint)
+        return bool(hit and hit[2] == "bad" and hit[0] > time.time())
+
+rug_cache = RugVerdictCache(os.path.join(STATE_DIR, "rugcheck.sqlite"))
+
+# ==== RUGCHECK & ML ====
+async def _fetch_rugcheck(token_addr: str) -> Dict[str, Any]:
+    url = f"{RUGCHECK_URL}{token_addr}"
+
+    async def fetch():
         async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=6)) as session:
             async with session.get(url) as r:
-                if r.headers.get('content-type','').startswith('application/json'):
-                    data = await r.json()
-                else:
-                    logger.warning(f"Rugcheck returned HTML for {token_addr}")
-                    data = {}
-        logger.info(f"Rugcheck {token_addr}: {data}")
-        return data
+                check_response("rugcheck", r)
+                if not r.headers.get('content-type','').startswith('application/json'):
+                    raise UpstreamError(f"rugcheck returned {r.headers.get('content-type')} for {token_addr}")
+                return await r.json()
+    try:
+        data = await upstreams["rugcheck"].call(fetch)
+        logger.info(f"Rugcheck {token_addr}: { {k: data[k] for k in RUG_FIELDS if k in data} }")
     except Exception as e:
-        logger.error(f"Rugcheck error for {token_addr}: {e}")
-        return {}
+        if not isinstance(e, UpstreamUnavailable):
+            logger.error(f"Rugcheck error for {token_addr}: {e}")
+            rug_cache.put(token_addr, {})
+        raise UpstreamError(f"rugcheck: {e}") from e
+    rug_cache.put(token_addr, data)
+    if recorder:
+        recorder.write("rug", token_addr, d={k: data[k] for k in RUG_FIELDS if k in data})
+    return data
+
+async def rugcheck(token_addr: str) -> Dict[str, Any]:
+    if rug_cache.failed_recently(token_addr):
+        raise UpstreamUnavailable(f"rugcheck failed recently for {token_addr}")
+    cached = rug_cache.get(token_addr)
+    if cached is not None:
+        return cached
+    fut = rug_cache.inflight.get(token_addr)
+    if fut is None:
+        fut = asyncio.ensure_future(_fetch_rugcheck(token_addr))
+        rug_cache.inflight[token_addr] = fut
+        fut.add_done_callback(lambda f: (rug_cache.inflight.pop(token_addr, None), f.cancelled() or f.exception()))
+    return await asyncio.shield(fut)
 
 def rug_gate(rug: Dict[str, Any]) -> Optional[str]:
     if rug.get("label") != "Good":
@@ -313,232 +1902,841 @@ def rug_gate(rug: Dict[str, Any]) -> Optional[str]:
         return "too concentrated"
     return None
 
+recent_rugdevs = set()
+
 def is_blacklisted(token: str, dev: str = "") -> bool:
-    return token in blacklisted_tokens or (dev and dev in blacklisted_devs)
+    return token in blacklisted_tokens or bool(dev and dev in blacklisted_devs) or rug_cache.is_rejected(token)
+
+# ==== ML SCORING ====
+# Features are read from what screening already fetched (DexScreener cache, liquidity sampler rings,
+# Bitquery flow windows, rugcheck cache, community votes); missing values stay NaN and are imputed
+# with the training mean. train_model.py fits the model offline from RECORD_PATH captures.
+FEATURES = (
+    "liq_log", "liq_slope", "liq_rises", "buyers_log", "holders_log", "max_holder_pct", "pool_age_min",
+    "vol_1h_log", "vol_6h_log", "flow_vol_log", "flow_buyers", "flow_surge", "rug_good", "rug_bundled",
+    "rug_max_holder_pct", "votes", "src_pumpfun", "src_scalper", "src_community",
+)
+FEATURE_INDEX = {name: i for i, name in enumerate(FEATURES)}
+
+def feature_vector(mint: str, src: str) -> np.ndarray:
+    v = np.full(len(FEATURES), np.nan)
+    f = FEATURE_INDEX
+    snap = dex.peek(mint)
+    if snap is not None:
+        v[f["liq_log"]] = np.log1p(snap.liq)
+        v[f["buyers_log"]] = np.log1p(snap.buyers)
+        v[f["holders_log"]] = np.log1p(snap.holders)
+        v[f["max_holder_pct"]] = snap.max_holder_pct
+        v[f["vol_1h_log"]] = np.log1p(snap.vol_1h)
+        v[f["vol_6h_log"]] = np.log1p(snap.vol_6h)
+        if snap.pool_age is not None:
+            v[f["pool_age_min"]] = min(snap.pool_age / 60, 24 * 60)
+    ring = liq_sampler.rings.get(mint)
+    if ring:
+        v[f["liq_rises"]] = count_rises(liq for _, liq, _ in ring)
+        if len(ring) > 1 and ring[-1][0] > ring[0][0]:
+            v[f["liq_slope"]] = (ring[-1][1] - ring[0][1]) / (ring[-1][0] - ring[0][0])
+    flow = trade_flow.stats(mint)
+    if flow is not None:
+        v[f["flow_vol_log"]] = np.log1p(flow["vol_short"])
+        v[f["flow_buyers"]] = flow["buyers"]
+        v[f["flow_surge"]] = float(flow["surge"])
+    rug = rug_cache.peek(mint)
+    if rug is not None:
+        v[f["rug_good"]] = float(rug.get("label") == "Good")
+        v[f["rug_bundled"]] = float("bundled" in str(rug.get("supply_type", "")).lower())
+        v[f["rug_max_holder_pct"]] = rug.get("max_holder_pct", np.nan)
+    v[f["votes"]] = len(community_votes.votes.get(mint, ()))
+    strategy = STRATEGY_OF_SRC.get(src, src)
+    for name in ("pumpfun", "scalper", "community"):
+        v[f[f"src_{name}"]] = float(strategy == name or src == name)
+    return v
+
+class LogisticModel:
+    # model.npy rows: feature mean, feature std, weights, [bias, 0...]; model.json lists the features.
+    def __init__(self, params: np.ndarray, meta: Dict[str, Any]):
+        self.mean, self.std, self.w = params[0], params[1], params[2]
+        self.bias = float(params[3][0])
+        self.meta = meta
+
+    @classmethod
+    def load(cls, path: str) -> Optional["LogisticModel"]:
+        if not os.path.exists(path):
+            logger.warning(f"No ML model at {path}; scores disabled, ML_MIN_SCORE not enforced.")
+            return None
+        try:
+            with open(os.path.splitext(path)[0] + ".json") as f:
+                meta = json.load(f)
+            if tuple(meta["features"]) != FEATURES:
+                logger.error(f"ML model {path} was trained on different features; ignoring it.")
+                return None
+            params = np.load(path, mmap_mode="r")
+            if params.shape != (4, len(FEATURES)):
+                raise ValueError(f"parameter shape {params.shape}, expected {(4, len(FEATURES))}")
+            model = cls(params, meta)
+        except Exception as e:
+            logger.error(f"ML model {path} failed to load: {e}")
+            return None
+        logger.info(f"Loaded ML model {path} ({meta.get('samples', '?')} samples, holdout AUC {meta.get('auc', '?')})")
+        return model
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        X = np.where(np.isnan(X), self.mean, X)
+        z = ((X - self.mean) / self.std) @ self.w + self.bias
+        return 100.0 / (1.0 + np.exp(-z))
+
+class MLScorer:
+    # Requests made during one loop iteration are scored together in a single matrix product.
+    def __init__(self, model: Optional[LogisticModel]):
+        self.model = model
+        self._batch: List[tuple] = []
+        self.scored = 0
+        self.batches = 0
+        self.latency: collections.deque = collections.deque(maxlen=1000)
+
+    def _flush(self):
+        batch, self._batch = self._batch, []
+        t0 = time.perf_counter()
+        try:
+            scores = self.model.predict(np.stack([x for x, _ in batch]))
+        except Exception as e:
+            # Every waiting screen gets the error instead of hanging on its future.
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        per_token = (time.perf_counter() - t0) / len(batch)
+        for (_, fut), score in zip(batch, scores):
+            if not fut.done():
+                fut.set_result(float(score))
+        self.scored += len(batch)
+        self.batches += 1
+        self.latency.append(per_token)
+
+    async def score(self, mint: str, src: str) -> Optional[float]:
+        x = feature_vector(mint, src)
+        if recorder:
+            recorder.write("feat", mint, src=src, x=[None if np.isnan(e) else round(float(e), 6) for e in x])
+        if self.model is None:
+            return None
+        fut = asyncio.get_running_loop().create_future()
+        if not self._batch:
+            asyncio.get_running_loop().call_soon(self._flush)
+        self._batch.append((x, fut))
+        return await fut
+
+ml = MLScorer(LogisticModel.load(MODEL_PATH))
+
+async def ml_check(token: str, src: str) -> tuple:
+    score = await ml.score(token, src)
+    if score is not None and score < ML_MIN_SCORE:
+        return score, f"ML score {score:.0f} < {ML_MIN_SCORE}"
+    return score, None
+
+# ==== SCREENING GATES ====
+class Gate:
+    __slots__ = ("name", "needs", "check")
+
+    def __init__(self, name: str, needs: tuple, check):
+        self.name = name
+        self.needs = needs
+        self.check = check
+
+# ==== LIQUIDITY SAMPLER ====
+def count_rises(liqs) -> int:
+    rises, last_liq = 0, 0.0
+    for liq in liqs:
+        if liq >= ULTRA_MIN_LIQ and liq > last_liq:
+            rises += 1
+        last_liq = liq
+    return rises
+
+class LiquiditySampler:
+    # One loop samples every watched mint per tick through batched dex.snapshots calls and keeps the
+    # last few (time, liq, buyers) per mint; handlers park on a future until the mint has risen often
+    # enough, or can no longer do so in the samples left.
+    def __init__(self, interval: float = ULTRA_SAMPLE_INTERVAL, depth: int = ULTRA_SAMPLE_DEPTH):
+        self.interval = interval
+        self.depth = depth
+        self.rings: Dict[str, collections.deque] = {}
+        self.taken: Dict[str, int] = {}
+        self.waiters: Dict[str, List[tuple]] = {}
+        self.ticks = 0
+        self._wake = asyncio.Event()
+
+    async def rises(self, token: str, need: int = ULTRA_MIN_RISES, samples: int = ULTRA_SAMPLES) -> int:
+        fut = asyncio.get_running_loop().create_future()
+        waiter = (fut, need, min(samples, self.depth), self.taken.get(token, 0))
+        self.waiters.setdefault(token, []).append(waiter)
+        self._wake.set()
+        try:
+            return await fut
+        finally:
+            waiters = self.waiters.get(token)
+            if waiters is not None and waiter in waiters:
+                waiters.remove(waiter)
+
+    def _check(self, token: str):
+        ring, taken = self.rings[token], self.taken[token]
+        for fut, need, samples, start in self.waiters.get(token, ()):
+            n = taken - start
+            if fut.done() or not n:
+                continue
+            rises = count_rises(liq for _, liq, _ in list(ring)[-n:])
+            if rises >= need or n >= samples or rises + samples - n < need:
+                fut.set_result(rises)
+
+    async def tick(self):
+        tokens = list(self.waiters)
+        snaps = await dex.snapshots(tokens)
+        now = time.time()
+        self.ticks += 1
+        for token in tokens:
+            if token not in snaps:
+                continue
+            snap = snaps[token]
+            ring = self.rings.get(token)
+            if ring is None:
+                ring = self.rings[token] = collections.deque(maxlen=self.depth)
+            ring.append((now, snap.liq if snap else 0.0, snap.buyers if snap else 0))
+            self.taken[token] = self.taken.get(token, 0) + 1
+            self._check(token)
+        for token in tokens:
+            if not self.waiters.get(token):
+                self.waiters.pop(token, None)
+                self.rings.pop(token, None)
+                self.taken.pop(token, None)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self.waiters:
+                self._wake.clear()
+                await self._wake.wait()
+            started = loop.time()
+            try:
+                await self.tick()
+            except Exception as e:
+                logger.error(f"Liquidity sampler tick failed: {e}")
+            await asyncio.sleep(max(0.0, started + self.interval - loop.time()))
+
+liq_sampler = LiquiditySampler()
+
+SCREEN_FETCHERS = {
+    "rug": rugcheck,
+    "price": fetch_token_price,
+    "volumes": fetch_volumes,
+    "flow": fetch_flow,
+    "pool_age": fetch_pool_age,
+    "holders": fetch_holders_and_conc,
+    "liq_rises": lambda token: liq_sampler.rises(token),
+}
+
+# Runs every fetch the gates need concurrently; the first failing gate cancels the rest.
+async def screen(token: str, gates: List[Gate], want: tuple = (), deadline: float = SCREEN_DEADLINE_S):
+    loop = asyncio.get_running_loop()
+    keys = {k for g in gates for k in g.needs} | set(want)
+    tasks = {asyncio.ensure_future(SCREEN_FETCHERS[k](token)): k for k in keys}
+    data: Dict[str, Any] = {}
+    remaining = list(gates)
+    give_up = loop.time() + deadline
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=give_up - loop.time(),
+                                               return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                return "decision deadline", data
+            for task in done:
+                if task.exception():
+                    metrics.unknown[tasks[task]] += 1
+                    return f"{tasks[task]} unknown ({task.exception()})", data
+                data[tasks[task]] = task.result()
+            for gate in [g for g in remaining if all(k in data for k in g.needs)]:
+                remaining.remove(gate)
+                reason = gate.check(data)
+                if reason:
+                    return f"{gate.name}: {reason}", data
+        return None, data
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+def _community_rug_check(d):
+    dev = d["rug"].get("authority")
+    return rug_gate(d["rug"]) or ("recent rugdev" if dev and dev in recent_rugdevs else None)
+
+ULTRA_GATES = [
+    Gate("rug", ("rug",), lambda d: rug_gate(d["rug"])),
+    Gate("liquidity", ("liq_rises",), lambda d: None if d["liq_rises"] >= ULTRA_MIN_RISES else "not rapidly rising"),
+]
+SCALPER_GATES = [
+    Gate("liquidity", ("volumes",), lambda d: None if d["volumes"]["liq"] >= SCALPER_MIN_LIQ else "too low"),
+    Gate("volume", ("volumes", "flow"), lambda d: None if has_volume_surge(d["flow"], d["volumes"]) else "no short-term surge"),
+    Gate("age", ("pool_age",), lambda d: None if 0 <= (d["pool_age"] or 9999) < SCALPER_MAX_POOLAGE else "pool too old"),
+    Gate("rug", ("rug",), lambda d: rug_gate(d["rug"])),
+]
+COMMUNITY_GATES = [
+    Gate("rug", ("rug",), _community_rug_check),
+    Gate("holders", ("holders",), lambda d: None if d["holders"]["holders"] >= COMM_HOLDER_THRESHOLD and d["holders"]["max_holder_pct"] <= COMM_MAX_CONC else "fails holder/distribution screen"),
+]
+
+# ==== EXECUTOR ====
+def buy_decision(mint: str, src: str, amount: float, price: float, msg: str, price_limit: Optional[float] = None, **pos) -> Dict[str, Any]:
+    # Plain JSON, so a decision made in a shard worker crosses the IPC channel unchanged.
+    return {"mint": mint, "src": src, "amount": amount, "price": price, "price_limit": price_limit, "msg": msg, "pos": pos}
+
+class Executor:
+    # The only place buys are sent and positions opened. Screening, in-process or in a shard worker, hands
+    # it buy decisions; it re-checks open positions, blacklists and the exposure cap before sending.
+    def __init__(self, max_exposure: float = MAX_EXPOSURE_SOL):
+        self.max_exposure = max_exposure
+        self.inflight: Dict[str, float] = {}
+        self.stats: collections.Counter = collections.Counter()
 
-def ml_score_token(meta: Dict[str, Any]) -> float:
-    random.seed(meta.get("mint", random.random()))
-    return random.uniform(70, 97)
+    def exposure(self) -> float:
+        return positions.open_size + sum(self.inflight.values())
+
+    async def buy(self, d: Dict[str, Any]) -> bool:
+        mint, src, amount, pos = d["mint"], d["src"], d["amount"], d["pos"]
+        strategy = STRATEGY_OF_SRC.get(src, src)
+        if mint in positions or mint in self.inflight or is_blacklisted(mint, pos.get("dev")):
+            self.stats["skipped"] += 1
+            activity_log.emit(mint, strategy, "skip", "Executor: already traded or blacklisted, skipping.")
+            return False
+        if self.max_exposure and self.exposure() + amount > self.max_exposure:
+            self.stats["over_exposure"] += 1
+            activity_log.emit(mint, strategy, "reject", f"Executor: exposure {self.exposure():.3f} + {amount} SOL over "
+                              f"cap {self.max_exposure} SOL, skipping.")
+            return False
+        self.inflight[mint] = amount
+        try:
+            order = await toxibot.send_buy(mint, amount, price_limit=d["price_limit"])
+        finally:
+            del self.inflight[mint]
+        positions.open(mint, src=src, buy_time=time.time(), size=amount, entry_price=d["price"], phase="waiting_fill", **pos)
+        fills.expect(mint, order, limit=d["price_limit"] is not None)
+        self.stats["bought"] += 1
+        activity_log.emit(mint, strategy, "buy", d["msg"], price=d["price"], size=amount)
+        return True
+
+executor = Executor()
 
 # ==== ULTRA-EARLY (pump.fun) ====
-async def ultra_early_handler(token, toxibot):
+async def ultra_early_handler(token):
     if is_blacklisted(token):
         return
-    rug = await rugcheck(token)
-    if rug_gate(rug):
-        activity_log.append(f"{token} UltraEarly: Rug gated.")
+    if token in positions:
+        activity_log.emit(token, "ultra", "skip", "UltraEarly: Already traded, skipping.")
+        return
+    reason, data = await screen(token, ULTRA_GATES, deadline=ULTRA_SCREEN_DEADLINE_S)
+    if reason:
+        activity_log.emit(token, "ultra", "reject", f"UltraEarly: {reason}, skipping.")
         return
     if token in positions:
-        activity_log.append(f"{token} UltraEarly: Already traded, skipping.")
+        activity_log.emit(token, "ultra", "skip", "UltraEarly: Already traded, skipping.")
         return
-    rises, last_liq, last_buyers = 0, 0, 0
-    for i in range(3):
-        stats = await fetch_liquidity_and_buyers(token)
-        if stats['liq'] >= ULTRA_MIN_LIQ and stats['liq'] > last_liq:
-            rises += 1
-        last_liq, last_buyers = stats['liq'], stats['buyers']
-        await asyncio.sleep(2)
-    if rises < ULTRA_MIN_RISES:
-        activity_log.append(f"{token} UltraEarly: Liquidity not rapidly rising, skipping.")
+    rug = data["rug"]
+    ml_score, reason = await ml_check(token, "pumpfun")
+    if reason:
+        activity_log.emit(token, "ultra", "reject", f"UltraEarly: {reason}, skipping.")
         return
-    entry_price = await fetch_token_price(token) or 0.01
-    await toxibot.send_buy(token, ULTRA_BUY_AMOUNT)
-    positions[token] = {
-        "src": "pumpfun",
-        "buy_time": time.time(),
-        "size": ULTRA_BUY_AMOUNT,
-        "ml_score": ml_score_token({"mint":token}),
-        "entry_price": entry_price,
-        "last_price": entry_price,
-        "phase": "filled",
-        "pl": 0.0,
-        "local_high": entry_price,
-        "hard_sl": entry_price * ULTRA_SL_X,
-        "runner_trail": 0.3,
-        "dev": rug.get("authority")
-    }
-    activity_log.append(f"{token} UltraEarly: BUY {ULTRA_BUY_AMOUNT} @ {entry_price:.5f}")
+    try:
+        entry_price = await fetch_token_price(token) or 0.01
+    except UpstreamError:
+        activity_log.emit(token, "ultra", "reject", "UltraEarly: price unknown, skipping.")
+        return
+    await executor.buy(buy_decision(
+        token, "pumpfun", ULTRA_BUY_AMOUNT, entry_price, f"UltraEarly: BUY {ULTRA_BUY_AMOUNT} @ {entry_price:.5f}",
+        ml_score=ml_score or 0.0,
+        hard_sl=entry_price * ULTRA_SL_X,
+        runner_trail=0.3,
+        dev=rug.get("authority"),
+    ))
 
 # ==== SCALPER
-async def scalper_handler(token, src, toxibot):
+async def scalper_handler(token, src):
     if is_blacklisted(token):
         return
     if token in positions:
-        activity_log.append(f"{token} [Scalper] Already traded. Skipping.")
+        activity_log.emit(token, "scalper", "skip", "[Scalper] Already traded. Skipping.")
         return
-    pool_stats = await fetch_volumes(token)
-    pool_age = await fetch_pool_age(token) or 9999
-    liq_ok = pool_stats["liq"] >= SCALPER_MIN_LIQ
-    vol_ok = estimate_short_vs_long_volume(pool_stats["vol_1h"], pool_stats["vol_6h"])
-    age_ok = 0 <= pool_age < SCALPER_MAX_POOLAGE
-    if not (liq_ok and age_ok and vol_ok):
-        activity_log.append(f"{token} [Scalper] Entry FAIL: Liq:{liq_ok}, Age:{age_ok}, Vol:{vol_ok}")
+    reason, data = await screen(token, SCALPER_GATES, want=("price",))
+    if reason:
+        activity_log.emit(token, "scalper", "reject", f"[Scalper] Entry FAIL: {reason}")
         return
-    rug = await rugcheck(token)
-    if rug_gate(rug):
-        activity_log.append(f"{token} [Scalper] Rug gated.")
+    if token in positions:
+        activity_log.emit(token, "scalper", "skip", "[Scalper] Already traded. Skipping.")
+        return
+    pool_stats, rug = data["volumes"], data["rug"]
+    ml_score, reason = await ml_check(token, src)
+    if reason:
+        activity_log.emit(token, "scalper", "reject", f"[Scalper] Entry FAIL: {reason}")
         return
-    entry_price = await fetch_token_price(token) or 0.01
+    entry_price = data["price"] or 0.01
     limit_price = entry_price * 0.97
-    await toxibot.send_buy(token, SCALPER_BUY_AMOUNT, price_limit=limit_price)
-    positions[token] = {
-        "src": src,
-        "buy_time": time.time(),
-        "size": SCALPER_BUY_AMOUNT,
-        "ml_score": ml_score_token({"mint": token}),
-        "entry_price": limit_price,
-        "last_price": limit_price,
-        "phase": "waiting_fill",
-        "pl": 0.0,
-        "local_high": limit_price,
-        "hard_sl": limit_price * SCALPER_SL_X,
-        "liq_ref": pool_stats["base_liq"],
-        "dev": rug.get("authority"),
-    }
-    activity_log.append(f"{token} Scalper: limit-buy {SCALPER_BUY_AMOUNT} @ {limit_price:.5f}")
+    await executor.buy(buy_decision(
+        token, src, SCALPER_BUY_AMOUNT, limit_price, f"Scalper: limit-buy {SCALPER_BUY_AMOUNT} @ {limit_price:.5f}",
+        price_limit=limit_price,
+        ml_score=ml_score or 0.0,
+        hard_sl=limit_price * SCALPER_SL_X,
+        liq_ref=pool_stats["base_liq"],
+        dev=rug.get("authority"),
+    ))
 
 # ==== COMMUNITY/WHALE
-recent_rugdevs = set()
-async def community_trade_manager(toxibot):
+async def community_handler(token):
+    if is_blacklisted(token):
+        return
+    if token in positions:
+        activity_log.emit(token, "community", "skip", "[Community] position open. No averaging down.")
+        return
+    reason, data = await screen(token, COMMUNITY_GATES, want=("price",))
+    if reason:
+        activity_log.emit(token, "community", "reject", f"[Community] rejected: {reason}.")
+        return
+    if token in positions:
+        activity_log.emit(token, "community", "skip", "[Community] position open. No averaging down.")
+        return
+    ml_score, reason = await ml_check(token, "community")
+    if reason:
+        activity_log.emit(token, "community", "reject", f"[Community] rejected: {reason}.")
+        return
+    entry_price = data["price"] or 0.01
+    await executor.buy(buy_decision(
+        token, "community", COMMUNITY_BUY_AMOUNT, entry_price, f"[Community] Buy {COMMUNITY_BUY_AMOUNT} @ {entry_price:.6f}",
+        ml_score=ml_score or 0.0,
+        hard_sl=entry_price * COMM_SL_PCT,
+        dev=data["rug"].get("authority"),
+        hold_until=time.time() + COMM_HOLD_SECONDS,
+    ))
+
+async def community_trade_manager():
     while True:
-        token = await community_token_queue.get()
-        if is_blacklisted(token):
-            continue
-        rug = await rugcheck(token)
-        dev = rug.get("authority")
-        if rug_gate(rug) or (dev and dev in recent_rugdevs):
-            activity_log.append(f"{token} [Community] rejected: Ruggate or rugdev.")
-            continue
-        holders_ = await fetch_holders_and_conc(token)
-        if holders_["holders"] < COMM_HOLDER_THRESHOLD or holders_["max_holder_pct"] > COMM_MAX_CONC:
-            activity_log.append(f"{token} [Community] fails holder/distribution screen.")
-            continue
-        if token in positions:
-            activity_log.append(f"{token} [Community] position open. No averaging down.")
-            continue
-        entry_price = await fetch_token_price(token) or 0.01
-        await toxibot.send_buy(token, COMMUNITY_BUY_AMOUNT)
-        now = time.time()
-        positions[token] = {
-            "src": "community",
-            "buy_time": now,
-            "size": COMMUNITY_BUY_AMOUNT,
-            "ml_score": ml_score_token({"mint": token}),
-            "entry_price": entry_price,
-            "last_price": entry_price,
-            "phase": "filled",
-            "pl": 0.0,
-            "local_high": entry_price,
-            "hard_sl": entry_price * COMM_SL_PCT,
-            "dev": dev,
-            "hold_until": now + COMM_HOLD_SECONDS
-        }
-        activity_log.append(f"{token} [Community] Buy {COMMUNITY_BUY_AMOUNT} @ {entry_price:.6f}")
+        await community_handler(await community_token_queue.get())
 
 # ==== process_token ====
 async def process_token(token, src):
     if src == "pumpfun":
-        await ultra_early_handler(token, toxibot)
+        await ultra_early_handler(token)
     elif src in ("moralis", "bitquery"):
-        await scalper_handler(token, src, toxibot)
+        await scalper_handler(token, src)
+    elif src == "community":
+        await community_handler(token)
+
+# ==== INGEST PIPELINE ====
+class IngestPipeline:
+    def __init__(self, handler, workers: int = PIPELINE_WORKERS, maxsize: int = PIPELINE_QUEUE_MAX,
+                 policy: str = PIPELINE_DROP_POLICY):
+        self.handler = handler
+        self.workers = workers
+        self.maxsize = maxsize
+        self.policy = policy
+        self.queues: Dict[str, collections.deque] = {}
+        self.pending: Set[str] = set()
+        self.stats: Dict[str, collections.Counter] = collections.defaultdict(collections.Counter)
+        self._ready = asyncio.Semaphore(0)
+        self._rr = 0
+
+    def submit(self, token: str, src: str) -> bool:
+        st = self.stats[src]
+        st["received"] += 1
+        if token in self.pending:
+            st["deduped"] += 1
+            return False
+        q = self.queues.setdefault(src, collections.deque())
+        if len(q) >= self.maxsize:
+            st["dropped"] += 1
+            if self.policy == "drop_newest":
+                return False
+            self.pending.discard(q.popleft())
+        else:
+            self._ready.release()
+        q.append(token)
+        self.pending.add(token)
+        st["enqueued"] += 1
+        st["max_depth"] = max(st["max_depth"], len(q))
+        return True
+
+    def depth(self, src: Optional[str] = None) -> int:
+        if src is not None:
+            return len(self.queues.get(src, ()))
+        return sum(len(q) for q in self.queues.values())
+
+    def _next(self):
+        ready = [src for src, q in self.queues.items() if q]
+        src = ready[self._rr % len(ready)]
+        self._rr += 1
+        return src, self.queues[src].popleft()
+
+    async def _worker(self):
+        while True:
+            await self._ready.acquire()
+            src, token = self._next()
+            try:
+                await self.handler(token, src)
+            except Exception as e:
+                logger.error(f"[Pipeline] {src} handler error for {token}: {e}")
+            finally:
+                self.pending.discard(token)
+                self.stats[src]["handled"] += 1
+
+    async def run(self):
+        await asyncio.gather(*(self._worker() for _ in range(self.workers)))
+
+pipeline = IngestPipeline(process_token)
+
+# ==== SHARDED SCREENING ====
+# With SHARD_WORKERS > 0 screening runs in that many worker processes, each with its own event loop,
+# HTTP pools and caches. This process keeps the feeds, ToxiBot, positions and exposure: it sends each
+# new mint to shard crc32(mint) % SHARD_WORKERS, and workers send back buy decisions, activity events
+# and blacklist additions. Both directions are newline-delimited JSON on one unix socket per worker.
+def shard_of(mint: str, n: int) -> int:
+    return zlib.crc32(mint.encode()) % n
+
+class RelayedFlow:
+    # Worker-side stand-in for trade_flow: the executor owns the Bitquery stream and ships each mint's
+    # window stats with it, so the volume gate and ML features read what they would in one process.
+    def __init__(self, maxlen: int = SHARD_FLOW_MAX):
+        self.maxlen = maxlen
+        self.mints: "collections.OrderedDict[str, Dict[str, Any]]" = collections.OrderedDict()
+        self.trades = 0
+
+    def put(self, mint: str, stats: Dict[str, Any]):
+        self.mints.pop(mint, None)
+        self.mints[mint] = stats
+        if len(self.mints) > self.maxlen:
+            self.mints.popitem(last=False)
+
+    def stats(self, mint: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        return self.mints.get(mint)
+
+class ShardRouter:
+    # Executor end: same submit() as IngestPipeline, plus the worker processes' lifecycle.
+    def __init__(self, n: int = SHARD_WORKERS, path: str = SHARD_SOCKET):
+        self.n = n
+        self.path = path
+        self.writers: List[Optional[asyncio.StreamWriter]] = [None] * n
+        self.stats: Dict[int, collections.Counter] = collections.defaultdict(collections.Counter)
+
+    def submit(self, token: str, src: str) -> bool:
+        i = shard_of(token, self.n)
+        st, writer = self.stats[i], self.writers[i]
+        if writer is None or writer.is_closing() or writer.transport.get_write_buffer_size() > SHARD_WRITE_BUFFER_MAX:
+            st["dropped"] += 1
+            return False
+        msg = {"op": "screen", "m": token, "src": src, "flow": trade_flow.stats(token),
+               "votes": community_votes.votes.get(token, {})}
+        writer.write(json.dumps(msg, separators=(",", ":")).encode() + b"\n")
+        st["routed"] += 1
+        return True
+
+    async def _apply(self, i: int, msg: Dict[str, Any]):
+        op = msg["op"]
+        self.stats[i][op] += 1
+        if op == "buy":
+            await executor.buy(msg["d"])
+        elif op == "event":
+            activity_log.emit(msg["m"], msg["s"], msg["k"], msg["msg"], **msg["n"])
+        elif op == "bl_token":
+            blacklisted_tokens.add(msg["v"])
+        elif op == "bl_dev":
+            blacklisted_devs.add(msg["v"])
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        i = -1
+        try:
+            hello = json_loads(await reader.readline())
+            i = hello["shard"]
+            self.writers[i] = writer
+            logger.info(f"[Shards] worker {i} connected (pid {hello['pid']})")
+            while line := await reader.readline():
+                try:
+                    await self._apply(i, json_loads(line))
+                except Exception as e:
+                    logger.error(f"[Shards] bad message from worker {i}: {e}")
+        except (ValueError, KeyError, ConnectionError) as e:
+            logger.warning(f"[Shards] worker {i} channel closed: {e}")
+        finally:
+            if i >= 0 and self.writers[i] is writer:
+                self.writers[i] = None
+            writer.close()
+
+    async def _worker(self, i: int):
+        proc = mp.get_context("spawn").Process(target=shard_main, args=(i, self.path), name=f"shard{i}", daemon=True)
+        proc.start()
+        loop = asyncio.get_running_loop()
+        exited = loop.create_future()
+        loop.add_reader(proc.sentinel, lambda: exited.done() or exited.set_result(None))
+        try:
+            await exited
+        finally:
+            loop.remove_reader(proc.sentinel)
+            if proc.is_alive():
+                proc.terminate()
+            proc.join(1)
+        raise RuntimeError(f"shard worker {i} exited with code {proc.exitcode}")
+
+    async def _forward_community(self):
+        while True:
+            self.submit(await community_token_queue.get(), "community")
+
+    async def run(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.path)
+        server = await asyncio.start_unix_server(self._serve, path=self.path)
+        logger.info(f"[Shards] screening on {self.n} worker processes via {self.path}")
+        async with server:
+            await asyncio.gather(self._forward_community(),
+                                 *(feeds.supervise(f"shard{i}", self._worker, i) for i in range(self.n)))
+
+shards: Optional[ShardRouter] = None
+
+class ExecutorLink:
+    # Worker end. Takes the place of executor, activity_log and journal inside a shard so the screening
+    # code runs unchanged; only blacklist additions are journaled, and the executor journals them.
+    def __init__(self, index: int, path: str):
+        self.index = index
+        self.path = path
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self.dropped: collections.Counter = collections.Counter()
+
+    def _send(self, msg: Dict[str, Any]) -> bool:
+        # Same cap as ShardRouter.submit: a stalled executor costs dropped messages, not worker memory.
+        if self._writer.transport.get_write_buffer_size() > SHARD_WRITE_BUFFER_MAX:
+            self.dropped[msg["op"]] += 1
+            return False
+        self._writer.write(json.dumps(msg, separators=(",", ":")).encode() + b"\n")
+        return True
+
+    async def buy(self, d: Dict[str, Any]) -> bool:
+        if not self._send({"op": "buy", "d": d}):
+            logger.warning(f"Shard {self.index}: executor backed up, buy of {d['mint']} dropped")
+            return False
+        return True
+
+    def emit(self, mint: str, strategy: str, kind: str, msg: str = "", **nums: float):
+        self._send({"op": "event", "m": mint, "s": strategy, "k": kind, "msg": msg, "n": nums})
+
+    def append(self, op: str, **fields):
+        if op in ("bl_token", "bl_dev"):
+            self._send({"op": op, **fields})
+
+    async def run(self):
+        reader, self._writer = await asyncio.open_unix_connection(self.path)
+        self._send({"op": "hello", "shard": self.index, "pid": os.getpid()})
+        while True:
+            await self._writer.drain()  # stop taking screens while our own output is backed up
+            line = await reader.readline()
+            if not line:
+                break
+            msg = json_loads(line)
+            mint = msg["m"]
+            if msg["flow"]:
+                trade_flow.put(mint, msg["flow"])
+            for src, ts in msg["votes"].items():
+                community_votes.vote(mint, src, ts)
+            pipeline.submit(mint, msg["src"])
+        raise ConnectionError("executor closed the shard channel")
+
+async def run_shard(link: ExecutorLink):
+    global recorder
+    await rug_cache.warm()
+    background = []
+    if RECORD_PATH:
+        path = re.sub(r"(\.jsonl)?(\.gz)?$", rf".shard{link.index}\g<0>", RECORD_PATH, count=1)
+        recorder = Recorder(path)
+        background.append(recorder.run())
+    try:
+        await asyncio.gather(link.run(), pipeline.run(), liq_sampler.run(), metrics.lag_monitor(), *background)
+    finally:
+        if recorder:
+            recorder.close()
+        await dex.close()
+
+def shard_main(index: int, path: str):
+    # Entry point of a spawned worker process.
+    global executor, activity_log, journal, trade_flow, rug_cache
+    for handler in logging.getLogger().handlers:
+        handler.setFormatter(logging.Formatter(f"%(asctime)s %(levelname)s [shard {index}] %(message)s"))
+    link = ExecutorLink(index, path)
+    executor = activity_log = journal = link
+    trade_flow = RelayedFlow()
+    rug_cache = RugVerdictCache(os.path.join(STATE_DIR, f"rugcheck.shard{index}.sqlite"))
+    try:
+        asyncio.run(run_shard(link))
+    except (ConnectionError, KeyboardInterrupt) as e:
+        logger.warning(f"Shard {index} stopping: {e}")
 
 # ==== Price Update & Exit Logic ====
+ExitAction = collections.namedtuple("ExitAction", "sell_pct keep blacklist_dev msg")
+
+# Each rule set maps one strategy book's columns (already sliced to the updated rows) to
+# (mask, action) pairs; masks are made mutually exclusive so a row takes at most one action.
+def _ultra_exit_rules(c, price, liq, now):
+    tp = (c["phase"] == FILLED) & (price >= c["entry"] * ULTRA_TP_X)
+    sl = ~tp & (price <= c["stop"])
+    trail = ~tp & ~sl & (c["phase"] == RUNNER) & (price < c["high"] * (1 - c["trail"]))
+    return [
+        (tp, ExitAction(85, 0.15, False, "UltraEarly: Sold 85% at 2x (runner armed).")),
+        (sl, ExitAction(100, 0.0, True, "UltraEarly: SL -30%, full exit, dev blacklisted.")),
+        (trail, ExitAction(100, 0.0, False, "UltraEarly: Runner trailed stopped at {price:.5f}.")),
+    ]
+
+def _scalper_exit_rules(c, price, liq, now):
+    liq_drop = liq < c["liq_ref"] * 0.6
+    tp = ~liq_drop & (c["phase"] == FILLED) & (price >= c["entry"] * SCALPER_TP_X)
+    runner = ~liq_drop & (c["phase"] == RUNNER)
+    trail = runner & (price < c["high"] * (1 - SCALPER_TRAIL))
+    sl = ~liq_drop & ~tp & ~trail & (price < c["stop"])
+    return [
+        (liq_drop, ExitAction(100, 0.0, True, "Scalper: Liq drop >40%. Blacklist dev. Exit!")),
+        (tp, ExitAction(80, 0.2, False, "Scalper: Sold 80% at 2x+. Runner.")),
+        (trail, ExitAction(100, 0.0, False, "Scalper: Runner trailed out. Exited.")),
+        (sl, ExitAction(100, 0.0, True, "Scalper: Hard SL hit. Blacklist dev.")),
+    ]
+
+def _community_exit_rules(c, price, liq, now):
+    live = (c["phase"] == FILLED) | (c["phase"] == RUNNER)
+    tp = live & (c["phase"] == FILLED) & (price >= c["entry"] * COMM_TP1_MULT)
+    sl = live & ~tp & (price <= c["stop"])
+    hold = live & ~tp & ~sl & (now > c["hold_until"])
+    trail = live & ~tp & ~sl & ~hold & (c["phase"] == RUNNER) & (price < c["high"] * (1 - COMM_TRAIL))
+    return [
+        (tp, ExitAction(50, 0.5, False, "[Community] Sold 50% at 2x! Runner.")),
+        (sl, ExitAction(100, 0.0, True, "[Community] -40% SL. Blacklist. Out.")),
+        (hold, ExitAction(100, 0.0, False, "[Community] 2 day exit.")),
+        (trail, ExitAction(100, 0.0, False, "[Community] Runner trailed out.")),
+    ]
+
+EXIT_RULES = {"ultra": _ultra_exit_rules, "scalper": _scalper_exit_rules, "community": _community_exit_rules}
+
+def evaluate_exits(book: StrategyBook, rows: np.ndarray, price: np.ndarray, liq: np.ndarray):
+    cols = book.cols
+    phase = cols["phase"][rows]
+    live = (phase != EXITED) & (phase != WAITING_FILL)
+    rows, price, liq = rows[live], price[live], liq[live]
+    if not len(rows):
+        return []
+    cols["last"][rows] = price
+    cols["high"][rows] = np.maximum(cols["high"][rows], price)
+    book.set_pl(rows, (price - cols["entry"][rows]) * cols["size"][rows])
+    view = {c: arr[rows] for c, arr in cols.items()}
+    decisions = []
+    for mask, action in EXIT_RULES[book.name](view, price, liq, time.time()):
+        for i in np.flatnonzero(mask):
+            decisions.append((book.records[rows[i]], action, float(price[i])))
+    return decisions
+
+async def apply_exit_updates(updates: Dict[str, tuple]):
+    # updates: mint -> (price, liq or None). State is mutated for every decision before any
+    # send is awaited, so a tick and a poll racing on the same position sell once.
+    by_book: Dict[str, list] = collections.defaultdict(list)
+    for token, (price, liq) in updates.items():
+        pos = positions.get(token)
+        if pos is not None and price:
+            by_book[pos.book.name].append((pos.row, price, np.nan if liq is None else liq))
+    sells = []
+    for name, entries in by_book.items():
+        rows, price, liq = (np.array(x) for x in zip(*entries))
+        for pos, action, last_price in evaluate_exits(positions.books[name], rows.astype(np.intp), price, liq):
+            if action.blacklist_dev and pos.dev:
+                blacklisted_devs.add(pos.dev)
+            if action.keep:
+                pos.size *= action.keep
+                pos.phase = "runner"
+            else:
+                pos.size = 0
+                pos.phase = "exited"
+            positions.touch(pos.mint)
+            activity_log.emit(pos.mint, pos.strategy, "take_profit" if action.keep else "exit",
+                              action.msg.format(price=last_price), price=last_price, pct=action.sell_pct)
+            sells.append(toxibot.send_sell(pos.mint, action.sell_pct, stop=not action.keep))
+    if sells:
+        await asyncio.gather(*sells)
+
+async def apply_exit_rules(token: str, last_price: Optional[float], liq: Optional[float] = None):
+    await apply_exit_updates({token: (last_price, liq)})
+
+def tick_price(trade: Dict[str, Any]) -> Optional[float]:
+    v_sol, v_tokens = trade.get("vSolInBondingCurve"), trade.get("vTokensInBondingCurve")
+    if v_sol and v_tokens:
+        return float(v_sol) / float(v_tokens)
+    sol, tokens = trade.get("solAmount"), trade.get("tokenAmount")
+    if sol and tokens:
+        return float(sol) / float(tokens)
+    return None
+
+class ExitEngine:
+    # Trade subscriptions for open positions; the pumpportal connection itself belongs to
+    # pumpfun_newtoken_feed, which attaches on connect and calls sync() from its receive loop.
+    def __init__(self):
+        self.subscribed: Set[str] = set()
+        self.last_tick: Dict[str, float] = {}
+        self.connected = False
+        self.ticks = 0
+
+    def is_live(self, token: str) -> bool:
+        return self.connected and time.time() - self.last_tick.get(token, 0) < EXIT_TICK_STALE_S
+
+    def attach(self):
+        self.connected = True
+        self.subscribed = set()
+        logger.info(f"[ExitEngine] Trade subscriptions on {PUMPPORTAL_WS_URL}")
+
+    def detach(self):
+        self.connected = False
+
+    async def sync(self, ws):
+        wanted = {t for t, p in positions.items() if p.size}
+        add, drop = wanted - self.subscribed, self.subscribed - wanted
+        if add:
+            await ws.send(json.dumps({"method": "subscribeTokenTrade", "keys": sorted(add)}))
+        if drop:
+            await ws.send(json.dumps({"method": "unsubscribeTokenTrade", "keys": sorted(drop)}))
+            for token in drop:
+                self.last_tick.pop(token, None)
+        self.subscribed = wanted
+
+    async def on_trade(self, trade: Dict[str, Any]):
+        token = trade.get("mint")
+        pos = positions.get(token)
+        price = tick_price(trade)
+        if pos is None or price is None:
+            return
+        self.ticks += 1
+        self.last_tick[token] = time.time()
+        if recorder:
+            recorder.write("tick", token, p=price)
+        await apply_exit_rules(token, price)
+
+
+exit_engine = ExitEngine()
+
 async def update_position_prices_and_wallet():
-    global positions, current_wallet_balance, daily_loss
+    global positions, exposure, daily_loss
     while True:
-        for token, pos in list(positions.items()):
-            last_price = await fetch_token_price(token)
-            if last_price:
-                pos['last_price'] = last_price
-                pos['local_high'] = max(pos.get("local_high", last_price), last_price)
-                pl = (last_price - pos['entry_price']) * (pos['size'])
-                pos['pl'] = pl
-
-                if pos["src"] == "pumpfun":
-                    if last_price >= pos['entry_price'] * ULTRA_TP_X and pos['phase'] == "filled":
-                        await toxibot.send_sell(token, 85)
-                        pos['size'] *= 0.15
-                        pos['phase'] = "runner"
-                        activity_log.append(f"{token} UltraEarly: Sold 85% at 2x (runner armed).")
-                    elif last_price <= pos["hard_sl"]:
-                        await toxibot.send_sell(token, 100)
-                        activity_log.append(f"{token} UltraEarly: SL -30%, full exit, dev blacklisted.")
-                        if pos.get("dev"):
-                            blacklisted_devs.add(pos["dev"])
-                        pos['size'] = 0
-                        pos['phase'] = "exited"
-                        continue
-                    elif pos["phase"] == "runner":
-                        if last_price < pos["local_high"] * (1 - pos["runner_trail"]):
-                            await toxibot.send_sell(token, 100)
-                            activity_log.append(f"{token} UltraEarly: Runner trailed stopped at {last_price:.5f}.")
-                            pos['size'] = 0
-                            pos['phase'] = "exited"
-                            continue
-
-                elif pos["src"] in ("moralis", "bitquery"):
-                    pool_stats = await fetch_volumes(token)
-                    if pool_stats["liq"] < pos.get("liq_ref", 0)*0.6:
-                        await toxibot.send_sell(token)
-                        activity_log.append(f"{token} Scalper: Liq drop >40%. Blacklist dev. Exit!")
-                        if pos.get("dev"):
-                            blacklisted_devs.add(pos["dev"])
-                        pos['size'] = 0
-                        pos['phase'] = "exited"
-                        continue
-                    if ('phase' not in pos or pos['phase'] == "waiting_fill") and last_price >= pos['entry_price']*SCALPER_TP_X:
-                        await toxibot.send_sell(token, 80)
-                        pos['size'] *= 0.2
-                        pos['phase'] = "runner"
-                        activity_log.append(f"{token} Scalper: Sold 80% at 2x+. Runner.")
-                    elif pos.get("phase", "") == "runner":
-                        if last_price < pos['local_high']*(1 - SCALPER_TRAIL):
-                            await toxibot.send_sell(token)
-                            activity_log.append(f"{token} Scalper: Runner trailed out. Exited.")
-                            pos['size'] = 0
-                            pos['phase'] = "exited"
-                        elif last_price < pos['hard_sl']:
-                            await toxibot.send_sell(token)
-                            activity_log.append(f"{token} Scalper: Hard SL hit. Blacklist dev.")
-                            if pos.get("dev"):
-                                blacklisted_devs.add(pos["dev"])
-                            pos['size'] = 0
-                            pos['phase'] = "exited"
-
-                elif pos["src"] == "community" and pos["phase"] == "filled":
-                    if last_price >= pos['entry_price'] * COMM_TP1_MULT:
-                        await toxibot.send_sell(token, 50)
-                        pos['size'] *= 0.5
-                        pos['phase'] = "runner"
-                        activity_log.append(f"{token} [Community] Sold 50% at 2x! Runner.")
-                    elif last_price <= pos['hard_sl']:
-                        await toxibot.send_sell(token)
-                        activity_log.append(f"{token} [Community] -40% SL. Blacklist. Out.")
-                        if pos.get("dev"):
-                            blacklisted_devs.add(pos["dev"])
-                        pos['size'] = 0
-                        pos['phase'] = "exited"
-                        continue
-                    elif time.time() > pos.get("hold_until", 0):
-                        await toxibot.send_sell(token)
-                        activity_log.append(f"{token} [Community] 2 day exit.")
-                        pos['size'] = 0
-                        pos['phase'] = "exited"
-                        continue
-                    elif pos.get("phase", "") == "runner":
-                        if last_price < pos["local_high"] * (1 - COMM_TRAIL):
-                            await toxibot.send_sell(token)
-                            activity_log.append(f"{token} [Community] Runner trailed out.")
-                            pos['size'] = 0
-                            pos['phase'] = "exited"
-
-        to_remove = [k for k,v in positions.items() if v['size']==0]
+        # Ticks carry no liquidity, so scalper positions are polled even while live; for those the
+        # tick price stays authoritative and the poll only contributes liquidity.
+        live = {token for token in positions if exit_engine.is_live(token)}
+        held = [token for token, pos in positions.items() if token not in live or pos.strategy == "scalper"]
+        if held:
+            snaps = await dex.snapshots(held)
+            await apply_exit_updates({token: (positions[token].last_price if token in live else snap.price, snap.liq)
+                                      for token, snap in snaps.items() if snap and token in positions})
+
+        to_remove = [k for k,v in positions.items() if v.size==0]
         for k in to_remove:
-            daily_loss += positions[k].get('pl',0)
+            pos = positions[k]
+            daily_loss += pos.pl
+            if recorder:
+                recorder.write("outcome", k, src=pos.src, pl=pos.pl, entry=pos.entry_price, ml=pos.ml_score)
             del positions[k]
-        bal = await fetch_wallet_balance()
-        if bal:
-            globals()["current_wallet_balance"] = bal
+        if to_remove:
+            exposure = positions.open_size
+            journal.append("totals", exposure=exposure, daily_loss=daily_loss)
         await asyncio.sleep(18)
 
 # ==== DASHBOARD_HTML ====
@@ -558,4 +2756,206 @@ DASHBOARD_HTML = r"""
 |Net P/L:|
 |Token|Source|Size|ML|Entry|Last|P/L|P/L %|Phase|Age|
 |--|--|--|--|--|--|--|--|--|--|
+<ul id="activity"></ul>
+<script>
+const list = document.getElementById("activity");
+new EventSource("/events").onmessage = (m) => {
+  const e = JSON.parse(m.data), li = document.createElement("li");
+  li.textContent = `${new Date(e.ts * 1000).toLocaleTimeString()} ${e.mint} ${e.msg}`;
+  list.prepend(li);
+  while (list.children.length > 200) list.lastChild.remove();
+};
+</script>
 """
+
+# ==== DASHBOARD SERVER ====
+async def handle_dashboard(request):
+    return web.Response(text=DASHBOARD_HTML, content_type="text/html")
+
+async def handle_events(request):
+    # A resume id that is malformed or ahead of this process (e.g. from before a restart) falls back to the backlog.
+    last = (request.headers.get("Last-Event-ID") or request.query.get("since") or "").strip()
+    if last.isdigit() and int(last) < activity_log.seq:
+        seq = int(last) + 1
+    else:
+        seq = max(activity_log.seq - SSE_BACKLOG, 0)
+    resp = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+    await resp.prepare(request)
+    while True:
+        try:
+            await activity_log.wait(seq, SSE_HEARTBEAT_S)
+        except asyncio.TimeoutError:
+            await resp.write(b": keepalive\n\n")
+            continue
+        batch = activity_log.since(seq)
+        if batch:
+            await resp.write("".join(f"id: {e.seq}\ndata: {e.to_json()}\n\n" for e in batch).encode())
+            seq = batch[-1].seq + 1
+        else:
+            seq = activity_log.seq
+
+def render_metrics() -> str:
+    lines = ["# TYPE toxibot_upstream_request_seconds histogram"]
+    for name, hist in sorted(metrics.latency.items()):
+        lines += hist.render("toxibot_upstream_request_seconds", f'upstream="{name}"')
+    lines.append("# TYPE toxibot_upstream_errors_total counter")
+    lines += [f'toxibot_upstream_errors_total{{upstream="{k}"}} {v}' for k, v in sorted(metrics.errors.items())]
+    lines.append("# TYPE toxibot_screen_unknown_total counter")
+    lines += [f'toxibot_screen_unknown_total{{input="{k}"}} {v}' for k, v in sorted(metrics.unknown.items())]
+    lines.append("# TYPE toxibot_upstream_rate gauge")
+    lines += [f'toxibot_upstream_rate{{upstream="{k}"}} {p.rate:.3f}' for k, p in upstreams.items()]
+    lines.append("# TYPE toxibot_upstream_circuit_open gauge")
+    lines += [f'toxibot_upstream_circuit_open{{upstream="{k}"}} {int(p.state != "closed")}' for k, p in upstreams.items()]
+    lines.append("# TYPE toxibot_upstream_events_total counter")
+    lines += [f'toxibot_upstream_events_total{{upstream="{k}",event="{e}"}} {v}'
+              for k, p in upstreams.items() for e, v in sorted(p.stats.items())]
+    lines.append("# TYPE toxibot_event_loop_lag_seconds histogram")
+    lines += metrics.loop_lag.render("toxibot_event_loop_lag_seconds")
+    lines.append(f"toxibot_event_loop_lag_last_seconds {metrics.last_lag:.6f}")
+    depths = {"community": community_token_queue.qsize(), "fills": len(fills.pending),
+              "liq_sampler": len(liq_sampler.waiters), "journal": len(journal._buf)}
+    depths.update({f"pipeline_{src}": len(q) for src, q in pipeline.queues.items()})
+    if isinstance(toxibot, OrderDispatcher):
+        depths["orders"] = toxibot.depth()
+    lines.append("# TYPE toxibot_queue_depth gauge")
+    lines += [f'toxibot_queue_depth{{queue="{k}"}} {v}' for k, v in sorted(depths.items())]
+    lines.append("# TYPE toxibot_feed_events_total counter")
+    lines += [f'toxibot_feed_events_total{{feed="{name}",event="{k}"}} {v}'
+              for name, st in sorted(feeds.stats.items()) for k, v in sorted(st.items())]
+    lines.append(f"toxibot_feed_seen_mints {len(feeds.seen)}")
+    lines.append(f"toxibot_flow_trades_total {trade_flow.trades}")
+    lines.append(f"toxibot_ml_scored_total {ml.scored}")
+    lines.append(f"toxibot_ml_batches_total {ml.batches}")
+    if ml.latency:
+        lines.append(f"toxibot_ml_seconds_per_token_max {max(ml.latency):.9f}")
+    lines.append(f"toxibot_flow_tracked_mints {len(trade_flow.mints)}")
+    lines.append("# TYPE toxibot_pipeline_tokens_total counter")
+    lines += [f'toxibot_pipeline_tokens_total{{source="{src}",outcome="{k}"}} {v}'
+              for src, st in sorted(pipeline.stats.items()) for k, v in sorted(st.items()) if k != "max_depth"]
+    if shards:
+        lines.append("# TYPE toxibot_shard_messages_total counter")
+        lines += [f'toxibot_shard_messages_total{{shard="{i}",event="{k}"}} {v}'
+                  for i, st in sorted(shards.stats.items()) for k, v in sorted(st.items())]
+    lines.append("# TYPE toxibot_executor_buys_total counter")
+    lines += [f'toxibot_executor_buys_total{{outcome="{k}"}} {v}' for k, v in sorted(executor.stats.items())]
+    lines.append(f"toxibot_exposure_sol {executor.exposure():.6f}")
+    lines.append("# TYPE toxibot_open_positions gauge")
+    lines += [f'toxibot_open_positions{{strategy="{k}"}} {v}' for k, v in positions.open_by_strategy().items()]
+    lines.append(f"toxibot_total_pl_sol {positions.total_pl:.6f}")
+    lines.append(f"toxibot_wallet_balance_sol {current_wallet_balance:.6f}")
+    lines.append("# TYPE toxibot_wallet_events_total counter")
+    lines += [f'toxibot_wallet_events_total{{event="{k}"}} {v}' for k, v in sorted(wallet.stats.items())]
+    if isinstance(toxibot, OrderDispatcher):
+        lines.append("# TYPE toxibot_orders_sent_total counter")
+        lines += [f'toxibot_orders_sent_total{{side="{k}"}} {v}' for k, v in sorted(toxibot.sent.items())]
+        lines.append(f"toxibot_orders_collapsed_total {toxibot.collapsed}")
+        lines.append(f"toxibot_orders_failed_total {toxibot.failed}")
+        lines.append(f"toxibot_telegram_flood_waits_total {toxibot.flood_waits}")
+    lines.append("# TYPE toxibot_fills_total counter")
+    lines += [f'toxibot_fills_total{{outcome="{k}"}} {v}' for k, v in sorted(fills.stats.items())]
+    lines.append("# TYPE toxibot_cache_requests_total counter")
+    for name, cache in (("dexscreener", dex), ("rugcheck", rug_cache)):
+        lines.append(f'toxibot_cache_requests_total{{cache="{name}",result="hit"}} {cache.hits}')
+        lines.append(f'toxibot_cache_requests_total{{cache="{name}",result="miss"}} {cache.misses}')
+    return "\n".join(lines) + "\n"
+
+async def handle_metrics(request):
+    return web.Response(text=render_metrics(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+# The sampler gets its own thread: in the default executor a long profile would hold a slot that
+# aiohttp's resolver needs for upstream DNS lookups. One profile runs at a time.
+profile_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="profiler")
+profile_running = False
+
+async def handle_profile(request):
+    global profile_running
+    try:
+        seconds = min(float(request.query.get("seconds", 10)), PROFILE_MAX_S)
+        interval = max(float(request.query.get("interval", PROFILE_MIN_INTERVAL_S)), PROFILE_MIN_INTERVAL_S)
+    except ValueError:
+        raise web.HTTPBadRequest(text="seconds and interval must be numbers")
+    if profile_running:
+        raise web.HTTPConflict(text="a profile is already running")
+    profile_running = True
+    try:
+        report = await asyncio.get_running_loop().run_in_executor(
+            profile_executor, sample_profile, threading.get_ident(), seconds, interval)
+    finally:
+        profile_running = False
+    return web.Response(text=report, content_type="text/plain")
+
+def build_web_app() -> web.Application:
+    app = web.Application()
+    app.router.add_get("/", handle_dashboard)
+    app.router.add_get("/events", handle_events)
+    app.router.add_get("/metrics", handle_metrics)
+    app.router.add_get("/debug/profile", handle_profile)
+    return app
+
+async def start_web_server() -> web.AppRunner:
+    runner = web.AppRunner(build_web_app())
+    await runner.setup()
+    await web.TCPSite(runner, "0.0.0.0", PORT).start()
+    logger.info(f"Dashboard listening on :{PORT}")
+    return runner
+
+# ==== MAIN ====
+async def on_feed_token(token, src):
+    # Every sighting counts as a community vote; only mints no feed has reported recently get screened.
+    # Bitquery reports a mint once, when its flow crosses the surge thresholds, which is usually long
+    # after pump.fun announced it, so those crossings are screened even if the mint was seen.
+    st = feeds.stats[src]
+    st["events"] += 1
+    if recorder:
+        recorder.write("feed", token, src=src)
+    await community_candidate_callback(token, src)
+    if feeds.seen.add(token) or src == "bitquery":
+        st["new"] += 1
+        (shards or pipeline).submit(token, src)
+    else:
+        st["duplicates"] += 1
+
+async def main():
+    global toxibot, recorder, shards
+    restore_state()
+    await rug_cache.warm()
+    toxibot = OrderDispatcher(ToxiBotClient(TELEGRAM_API_ID, TELEGRAM_API_HASH, TELEGRAM_STRING_SESSION, TOXIBOT_USERNAME))
+    await toxibot.connect()
+    toxibot.on_reply(fills.on_reply)
+    for mint, pos in positions.items():
+        if pos.phase == "waiting_fill":
+            fills.expect(mint, limit=pos.strategy == "scalper")
+    web_runner = await start_web_server()
+    if SHARD_WORKERS > 0:
+        shards = ShardRouter()
+        screening = [shards.run()]
+    else:
+        screening = [pipeline.run(), liq_sampler.run(), community_trade_manager()]
+    background = []
+    if RECORD_PATH:
+        recorder = Recorder(RECORD_PATH)
+        background.append(recorder.run())
+        logger.info(f"Recording feed and upstream responses to {RECORD_PATH}")
+
+    try:
+        await asyncio.gather(
+            *(feeds.supervise(name, feed, on_feed_token) for name, feed in enabled_feeds().items()),
+            feeds.report(),
+            *screening,
+            toxibot.run(),
+            fills.run(),
+            metrics.lag_monitor(),
+            wallet.run(),
+            update_position_prices_and_wallet(),
+            journal.run(),
+            *background,
+        )
+    finally:
+        if recorder:
+            recorder.close()
+        await journal.flush(snapshot=True)
+        await web_runner.cleanup()
+        await dex.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
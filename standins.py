@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# Local stand-ins for upstream services. Point the bot at them with
+# PUMPPORTAL_WS_URL=ws://127.0.0.1:<port> to replay ticks without touching mainnet, and
+# DEXSCREENER_URL / RUGCHECK_URL / HELIUS_RPC_URL / HELIUS_WS_URL at UpstreamStandIn for the Helius and HTTP APIs.
+import asyncio, collections, json, logging, os, random, re, sys, time, zlib, websockets
+from aiohttp import web
+from typing import Set, Dict, Any, List, Optional
+
+logger = logging.getLogger("standins")
+
+# main reads its Telegram credentials at import; tools that never talk to Telegram (backtest, bench,
+# train_model, the tests) call offline_env() before importing it.
+OFFLINE_ENV = {"TELEGRAM_API_ID": "0", "TELEGRAM_API_HASH": "", "TELEGRAM_STRING_SESSION": ""}
+
+def offline_env():
+    for key, value in OFFLINE_ENV.items():
+        os.environ.setdefault(key, value)
+
+class PumpPortalStandIn:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self.clients: Dict[Any, Set[str]] = {}
+        self.new_token_clients: Set[Any] = set()
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    async def start(self):
+        self._server = await websockets.serve(self._handler, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"PumpPortal stand-in listening on {self.url}")
+        return self
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handler(self, ws, path=None):
+        self.clients[ws] = set()
+        try:
+            async for msg in ws:
+                req = json.loads(msg)
+                method, keys = req.get("method"), req.get("keys") or []
+                if method == "subscribeNewToken":
+                    self.new_token_clients.add(ws)
+                elif method == "subscribeTokenTrade":
+                    self.clients[ws].update(keys)
+                elif method == "unsubscribeTokenTrade":
+                    self.clients[ws].difference_update(keys)
+                await ws.send(json.dumps({"message": f"ok {method}"}))
+        finally:
+            self.clients.pop(ws, None)
+            self.new_token_clients.discard(ws)
+
+    def subscribers(self, mint: str) -> List[Any]:
+        return [ws for ws, keys in self.clients.items() if mint in keys]
+
+    async def push_new_token(self, mint: str):
+        msg = json.dumps({"params": {"mintAddress": mint}, "txType": "create", "ts": time.time()})
+        await asyncio.gather(*(ws.send(msg) for ws in list(self.new_token_clients)), return_exceptions=True)
+
+    async def push_trade(self, mint: str, price: float, tx_type: str = "buy", sol: float = 0.1):
+        v_tokens = 1_000_000_000.0
+        msg = json.dumps({
+            "mint": mint, "txType": tx_type, "solAmount": sol, "tokenAmount": sol / price,
+            "vSolInBondingCurve": price * v_tokens, "vTokensInBondingCurve": v_tokens,
+        })
+        await asyncio.gather(*(ws.send(msg) for ws in self.subscribers(mint)), return_exceptions=True)
+
+    async def replay(self, ticks: List[Dict[str, Any]], speed: float = 1.0):
+        # Each tick: {"t": seconds from start, "mint": ..., "price": ...} or {"t": ..., "new_token": mint}
+        start = time.monotonic()
+        for tick in sorted(ticks, key=lambda x: x.get("t", 0)):
+            delay = tick.get("t", 0) / speed - (time.monotonic() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if "new_token" in tick:
+                await self.push_new_token(tick["new_token"])
+            else:
+                await self.push_trade(tick["mint"], float(tick["price"]), tick.get("txType", "buy"))
+
+class UpstreamStandIn:
+    # DexScreener, rugcheck.xyz and Helius JSON-RPC plus its accountSubscribe websocket on one aiohttp
+    # server. Liquidity and price of every mint rise with the time since it was first requested, so
+    # ultra-early gates can pass. Subscribed wallets get a balance notification every notify_interval.
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.05, jitter: float = 0.02,
+                 error_rate: float = 0.0, rug_good_rate: float = 0.8, notify_interval: float = 1.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rug_good_rate = rug_good_rate
+        self.notify_interval = notify_interval
+        self.first_seen: Dict[str, float] = {}
+        self.requests: collections.Counter = collections.Counter()
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def ws_url(self) -> str:
+        return f"ws://{self.host}:{self.port}/ws"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/latest/dex/tokens/{mints}", self._dex)
+        app.router.add_get("/api/check/{mint}", self._rug)
+        app.router.add_post("/rpc", self._rpc)
+        app.router.add_get("/ws", self._ws)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        logger.info(f"Upstream stand-in listening on {self.url}")
+        return self
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def _delay(self, name: str) -> bool:
+        self.requests[name] += 1
+        await asyncio.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+        return random.random() < self.error_rate
+
+    def pair(self, mint: str, now: float) -> Dict[str, Any]:
+        age = now - self.first_seen.setdefault(mint, now)
+        return {
+            "baseToken": {"address": mint}, "priceNative": f"{1e-6 * (1 + 0.05 * age):.10f}",
+            "liquidity": {"base": 10 + 20 * age}, "volume": {"h1": 100 + 10 * age, "h6": 120},
+            "pairCreatedAt": int((now - age) * 1000), "buyTxns": int(3 * age),
+        }
+
+    async def _dex(self, request):
+        if await self._delay("dexscreener"):
+            return web.Response(status=429, text="rate limited")
+        now = time.time()
+        return web.json_response({"pairs": [self.pair(m, now) for m in request.match_info["mints"].split(",")]})
+
+    async def _rug(self, request):
+        if await self._delay("rugcheck"):
+            return web.Response(status=503, text="<html>busy</html>", content_type="text/html")
+        mint = request.match_info["mint"]
+        good = (zlib.crc32(mint.encode()) % 1000) / 1000 < self.rug_good_rate
+        return web.json_response({"mint": mint, "label": "Good" if good else "Danger", "supply_type": "normal", "authority": f"dev-{mint[:6]}"})
+
+    async def _rpc(self, request):
+        if await self._delay("helius"):
+            return web.Response(status=500, text="error")
+        body = await request.json()
+        calls = body if isinstance(body, list) else [body]
+        results = []
+        for call in calls:
+            if call.get("method") == "getBalance":
+                result = {"context": {"slot": 1}, "value": 1_000_000_000}
+            else:
+                result = {"context": {"slot": 1}, "value": []}
+            results.append({"jsonrpc": "2.0", "id": call.get("id"), "result": result})
+        return web.json_response(results if isinstance(body, list) else results[0])
+
+    async def _ws(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        subs: Dict[int, str] = {}
+
+        async def notify():
+            lamports = 1_000_000_000
+            while True:
+                await asyncio.sleep(self.notify_interval)
+                lamports -= 1_000_000
+                for sub in list(subs):
+                    self.requests["helius_ws_notify"] += 1
+                    await ws.send_json({"jsonrpc": "2.0", "method": "accountNotification", "params": {
+                        "subscription": sub, "result": {"context": {"slot": 1}, "value": {"lamports": lamports}}}})
+        pusher = asyncio.ensure_future(notify())
+        try:
+            async for msg in ws:
+                req = json.loads(msg.data)
+                if req.get("method") == "accountSubscribe":
+                    self.requests["helius_ws_subscribe"] += 1
+                    subs[len(subs) + 1] = req["params"][0]
+                    await ws.send_json({"jsonrpc": "2.0", "id": req["id"], "result": len(subs)})
+        finally:
+            pusher.cancel()
+        return ws
+
+class FakeTelegramSink:
+    # Stands in for the Telethon client behind ToxiBotClient; records when each command was sent.
+    COMMAND = re.compile(r"^/(buy|sell) (\S+)")
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.sent: List[tuple] = []
+        self.first_buy: Dict[str, float] = {}
+
+    async def start(self):
+        pass
+
+    async def send_message(self, entity, text: str):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        now = time.time()
+        self.sent.append((now, text))
+        m = self.COMMAND.match(text)
+        if m and m.group(1) == "buy":
+            self.first_buy.setdefault(m.group(2), now)
+
+def load_ticks(path: str) -> List[Dict[str, Any]]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+async def _serve_pumpportal(port: int, ticks_path: str = ""):
+    standin = await PumpPortalStandIn(port=port).start()
+    print(standin.url, flush=True)
+    if ticks_path:
+        await asyncio.sleep(2)
+        await standin.replay(load_ticks(ticks_path))
+    await asyncio.Future()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    asyncio.run(_serve_pumpportal(port, sys.argv[2] if len(sys.argv) > 2 else ""))
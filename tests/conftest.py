@@ -0,0 +1,8 @@
+import os, sys, tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from standins import offline_env
+
+offline_env()
+os.environ.setdefault("STATE_DIR", tempfile.mkdtemp(prefix="toxibot-test-"))
+os.environ.setdefault("MODEL_PATH", os.path.join(os.environ["STATE_DIR"], "model.npy"))
@@ -0,0 +1,32 @@
+import gzip, json
+import backtest
+
+def _capture(path, start: float = 1_700_000_000.0):
+    events = []
+    for i in range(6):
+        mint, t0 = f"mint{i}pump", start + i * 30
+        events.append({"t": t0, "k": "feed", "m": mint, "src": "pumpfun"})
+        events.append({"t": t0, "k": "rug", "m": mint, "d": {"label": "Good", "supply_type": "normal", "authority": f"dev{i}"}})
+        for step in range(0, 900, 2):
+            price = 1e-6 * (1 + step / (100 + 40 * i))
+            events.append({"t": t0 + step, "k": "dex", "m": mint,
+                           "d": [price, 10 + step, 10 + step, 100.0, 120.0, 50, 0.05, step, t0]})
+    with gzip.open(path, "wt") as f:
+        for e in events:
+            f.write(json.dumps(e) + "\n")
+
+def test_consecutive_runs_in_one_process_are_identical(tmp_path):
+    path = str(tmp_path / "cap.jsonl.gz")
+    _capture(path)
+    runs = [backtest.run_backtest(path, {"ULTRA_TP_X": 2.0}, tail=600) for _ in range(3)]
+    assert runs[0]["buys"] > 0
+    keys = ("pl", "buys", "sells", "unfilled", "open_positions")
+    assert all({k: r[k] for k in keys} == {k: runs[0][k] for k in keys} for r in runs)
+
+def test_run_backtest_restores_every_replaced_global(tmp_path):
+    import main
+    path = str(tmp_path / "cap.jsonl.gz")
+    _capture(path)
+    before = {name: getattr(main, name) for name in backtest.REPLAY_GLOBALS}
+    backtest.run_backtest(path, {}, tail=60)
+    assert all(getattr(main, name) is value for name, value in before.items())
@@ -0,0 +1,85 @@
+import asyncio, types
+import pytest
+import main
+
+class StubDex:
+    def __init__(self, liq: float, price: float):
+        self.snap = types.SimpleNamespace(price=price, liq=liq)
+
+    async def snapshots(self, tokens):
+        return {t: self.snap for t in tokens}
+
+class StubToxiBot:
+    def __init__(self):
+        self.sells = []
+
+    async def send_sell(self, mint, perc=100, **kw):
+        self.sells.append((mint, perc))
+
+@pytest.mark.parametrize("liq, sold", [(3.0, [("SCALP", 100)]), (9.0, [])])
+def test_scalper_liquidity_exit_runs_while_ticks_are_live(monkeypatch, liq, sold):
+    bot = StubToxiBot()
+    monkeypatch.setattr(main, "positions", main.PositionTable())
+    monkeypatch.setattr(main, "activity_log", main.EventRing(100))
+    monkeypatch.setattr(main, "blacklisted_devs", set())
+    monkeypatch.setattr(main, "toxibot", bot)
+    monkeypatch.setattr(main, "dex", StubDex(liq, price=5.0))
+    monkeypatch.setattr(main, "exit_engine", main.ExitEngine())
+    main.positions.open("SCALP", src="moralis", size=0.1, entry_price=1.0, hard_sl=0.7, liq_ref=10.0, phase="filled")
+    main.exit_engine.connected = True
+    main.exit_engine.last_tick["SCALP"] = main.time.time()
+
+    async def run():
+        task = asyncio.ensure_future(main.update_position_prices_and_wallet())
+        await asyncio.sleep(0.05)
+        task.cancel()
+    asyncio.run(run())
+    assert bot.sells == sold
+    if not sold:
+        # The poll's 5x price must not reach the take-profit while ticks are live.
+        assert main.positions["SCALP"].last_price == 1.0
+
+def test_scalper_hard_stop_applies_before_the_runner_phase(monkeypatch):
+    bot = StubToxiBot()
+    monkeypatch.setattr(main, "positions", main.PositionTable())
+    monkeypatch.setattr(main, "activity_log", main.EventRing(100))
+    monkeypatch.setattr(main, "blacklisted_devs", set())
+    monkeypatch.setattr(main, "toxibot", bot)
+    main.positions.open("SCALP", src="moralis", size=0.1, entry_price=1.0, hard_sl=0.7, liq_ref=10.0, phase="filled")
+    asyncio.run(main.apply_exit_rules("SCALP", 0.5, 9.0))
+    assert bot.sells == [("SCALP", 100)]
+
+def test_new_tokens_and_trades_share_one_pumpportal_connection(monkeypatch):
+    from standins import PumpPortalStandIn
+    bot = StubToxiBot()
+    monkeypatch.setattr(main, "positions", main.PositionTable())
+    monkeypatch.setattr(main, "activity_log", main.EventRing(100))
+    monkeypatch.setattr(main, "blacklisted_devs", set())
+    monkeypatch.setattr(main, "toxibot", bot)
+    monkeypatch.setattr(main, "exit_engine", main.ExitEngine())
+    monkeypatch.setattr(main, "EXIT_SYNC_INTERVAL", 0.05)
+
+    async def run():
+        standin = await PumpPortalStandIn().start()
+        monkeypatch.setattr(main, "PUMPPORTAL_WS_URL", standin.url)
+        seen = []
+
+        async def on_token(token, src):
+            seen.append((token, src))
+            main.positions.open(token, src=src, size=0.07, entry_price=1.0, hard_sl=0.7, phase="filled")
+        feed = asyncio.ensure_future(main.pumpfun_newtoken_feed(on_token))
+        while not standin.new_token_clients:
+            await asyncio.sleep(0.01)
+        await standin.push_new_token("NEWMINT")
+        while not standin.subscribers("NEWMINT"):
+            await asyncio.sleep(0.01)
+        await standin.push_trade("NEWMINT", 0.5)
+        await asyncio.sleep(0.1)
+        connections = len(standin.clients)
+        feed.cancel()
+        await asyncio.gather(feed, return_exceptions=True)
+        await standin.stop()
+        return seen, connections
+    seen, connections = asyncio.run(run())
+    assert seen == [("NEWMINT", "pumpfun")] and connections == 1
+    assert bot.sells == [("NEWMINT", 100)] and not main.exit_engine.connected
@@ -0,0 +1,42 @@
+import asyncio
+import main
+
+def test_bitquery_crossing_is_screened_after_pumpfun_saw_the_mint(monkeypatch):
+    monkeypatch.setattr(main, "feeds", main.FeedSupervisor())
+    monkeypatch.setattr(main, "community_votes", main.VoteAggregator())
+    monkeypatch.setattr(main, "community_token_queue", asyncio.Queue())
+    submitted = []
+    monkeypatch.setattr(main, "pipeline", type("P", (), {"submit": lambda self, t, s: submitted.append((t, s))})())
+
+    async def run():
+        await main.on_feed_token("MINTpump", "pumpfun")
+        await main.on_feed_token("MINTpump", "moralis")
+        await main.on_feed_token("MINTpump", "bitquery")
+    asyncio.run(run())
+    assert submitted == [("MINTpump", "pumpfun"), ("MINTpump", "bitquery")]
+    assert main.feeds.stats["moralis"]["duplicates"] == 1
+
+def test_pushed_mint_keeps_trimming_its_windows():
+    flow = main.TradeFlow()
+    t0 = 1_700_000_000.0
+    for i in range(60):
+        flow.add("HOT", 2.0, f"buyer{i}", t0 + i)
+    assert flow.crossed("HOT", t0 + 60)
+    for i in range(6 * 3600):
+        flow.add("HOT", 0.1, f"late{i}", t0 + 60 + i)
+    hot = flow.mints["HOT"]
+    assert len(hot.buyers) <= main.FLOW_SHORT_S + 1
+    assert len(hot.buckets) <= main.FLOW_LONG_S / main.FLOW_BUCKET_S + 1
+
+def test_screened_flow_is_recorded_and_replayed(tmp_path, monkeypatch):
+    import backtest
+    path = str(tmp_path / "cap.jsonl")
+    monkeypatch.setattr(main, "trade_flow", main.TradeFlow())
+    monkeypatch.setattr(main, "recorder", main.Recorder(path))
+    main.trade_flow.add("MINT", 30.0, "buyer", main.time.time())
+    live = asyncio.run(main.fetch_flow("MINT"))
+    missing = asyncio.run(main.fetch_flow("NOFLOW"))
+    main.recorder.close()
+    replayed = backtest.ReplayFlow(backtest.Capture(path))
+    assert replayed.stats("MINT", main.time.time() + 1) == live
+    assert missing is None and replayed.stats("NOFLOW", main.time.time() + 1) is None
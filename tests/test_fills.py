@@ -0,0 +1,112 @@
+import asyncio
+import pytest
+import main
+
+MINT = "7GCihgDB8fe6KNjn2MYtkzZcRjQy3t9GHdC8uHYmW2hr"
+OTHER = "EKpQGSJtjMFqKZ9KQanSqYXRcF8fBopzLHYxdM65zcjm"
+
+@pytest.mark.parametrize("text, status, sol, price", [
+    (f"✅ Bought 0.07 SOL of {MINT}", "filled", 0.07, None),
+    (f"✅ Bought 1,400,000 BONK for 0.07 SOL\n{MINT}\nSell with /sell {MINT} 100%", "filled", 0.07, 0.07 / 1_400_000),
+    (f"Buy executed: received 70000 tokens for 0.07 SOL ({MINT})", "filled", 0.07, 0.07 / 70_000),
+    (f"Limit order filled: got 2.5M $WIF for 0.1 SOL {MINT}", "filled", 0.1, None),
+    (f"❌ Buy failed: insufficient balance for 0.07 SOL {MINT}", "failed", 0.07, None),
+    ("Transaction failed: slippage exceeded", "failed", None, None),
+    (f"Order cancelled for {MINT}", "cancelled", None, None),
+])
+def test_parse_reply(text, status, sol, price):
+    reply = main.parse_reply(text)
+    assert reply["status"] == status
+    assert reply["sol"] == sol
+    assert reply["price"] == pytest.approx(price) if price else reply["price"] is None
+
+@pytest.mark.parametrize("text", [
+    f"✅ Sold 100% of {MINT} for 0.12 SOL",
+    f"Sell failed: slippage exceeded {MINT}",
+    "Welcome! Use /buy <mint> <amount> to trade.",
+])
+def test_parse_reply_ignores_other_replies(text):
+    assert main.parse_reply(text) is None
+
+def _open(mint: str, entry: float = 1e-6):
+    main.positions.open(mint, src="pumpfun", size=0.07, entry_price=entry, hard_sl=entry * main.ULTRA_SL_X, phase="waiting_fill")
+
+@pytest.fixture
+def fills(monkeypatch):
+    monkeypatch.setattr(main, "positions", main.PositionTable())
+    monkeypatch.setattr(main, "activity_log", main.EventRing(100))
+    tracker = main.FillTracker()
+    monkeypatch.setattr(main, "fills", tracker)
+    return tracker
+
+def test_sol_amount_never_becomes_the_price(fills):
+    _open(MINT)
+    fills.expect(MINT)
+    fills.on_reply(f"✅ Bought 0.07 SOL of {MINT}")
+    pos = main.positions[MINT]
+    assert pos.phase == "filled"
+    assert pos.entry_price == pytest.approx(1e-6)
+    assert pos.hard_sl == pytest.approx(1e-6 * main.ULTRA_SL_X)
+
+def test_mintless_replies_only_match_the_last_sent_buy(fills, monkeypatch):
+    async def run():
+        dispatcher = main.OrderDispatcher(main.ToxiBotClient(0, "", "", "@t", client=object()))
+        monkeypatch.setattr(main, "toxibot", dispatcher)
+        _open(MINT)
+        _open(OTHER)
+        fills.expect(MINT, await dispatcher.send_buy(MINT, 0.07))
+        fills.expect(OTHER, await dispatcher.send_buy(OTHER, 0.07))
+        dispatcher.last_sent = await dispatcher.send_sell(OTHER, 100)
+        fills.on_reply("Transaction failed: slippage exceeded")
+        assert set(fills.pending) == {MINT, OTHER}
+        dispatcher.last_sent = dispatcher._pending[(MINT, "buy")]
+        fills.on_reply("Transaction failed: slippage exceeded")
+        assert MINT not in main.positions and OTHER in main.positions
+    asyncio.run(run())
+
+class StubCancel:
+    def __init__(self):
+        self.cancelled = []
+
+    async def cancel(self, mint):
+        self.cancelled.append(mint)
+
+async def _no_quote(token):
+    return None
+
+def test_only_our_own_cancel_is_acknowledged(fills, monkeypatch):
+    monkeypatch.setattr(main, "toxibot", StubCancel())
+    monkeypatch.setattr(main, "fetch_token_price", _no_quote)
+    _open(MINT)
+    fills.expect(MINT, limit=True)
+    _open(OTHER)
+    fills.expect(OTHER)
+    asyncio.run(fills.expire(main.time.time() + main.FILL_TIMEOUT_LIMIT_S + 1))
+    assert main.toxibot.cancelled == [MINT] and MINT not in main.positions
+    fills.on_reply(f"Order cancelled for {MINT}")
+    assert not fills.cancelling
+    # ToxiBot cancelling a market buy on its own is a rejection, not an acknowledgement.
+    fills.on_reply(f"Order cancelled for {OTHER}")
+    assert OTHER not in main.positions and fills.stats["unfilled"] == 2
+
+@pytest.mark.parametrize("quote, held, phase, entry", [
+    (2e-6, None, "filled", 2e-6),
+    (None, None, "waiting_fill", 1e-6),
+    (None, 35_000.0, "filled", 0.07 / 35_000),
+])
+def test_market_timeout_never_books_the_pre_order_quote(fills, monkeypatch, quote, held, phase, entry):
+    async def fetch_token_price(token):
+        return quote
+    monkeypatch.setattr(main, "fetch_token_price", fetch_token_price)
+    tracker = main.WalletTracker("owner", "", "")
+    if held is not None:
+        tracker._ws = object()
+        tracker.holdings[MINT] = held
+    monkeypatch.setattr(main, "wallet", tracker)
+    _open(MINT)
+    fills.expect(MINT)
+    asyncio.run(fills.expire(main.time.time() + main.FILL_TIMEOUT_MARKET_S + 1))
+    pos = main.positions[MINT]
+    assert pos.phase == phase and pos.entry_price == pytest.approx(entry)
+    asyncio.run(fills.expire(main.time.time() + 2 * main.FILL_TIMEOUT_MARKET_S + 1))
+    assert (MINT in main.positions) == (phase == "filled")
@@ -0,0 +1,69 @@
+import asyncio, json, os
+import pytest
+import main
+
+def _start(monkeypatch, directory):
+    # A fresh process: new journal and empty module state, then the warm restart main() does.
+    if main.journal._fh is not None and main.journal.journal_path.startswith(str(directory)):
+        main.journal._fh.close()
+    monkeypatch.setattr(main, "journal", main.StateJournal(str(directory)))
+    monkeypatch.setattr(main, "positions", main.PositionTable())
+    monkeypatch.setattr(main, "blacklisted_tokens", main.JournaledSet("bl_token"))
+    monkeypatch.setattr(main, "blacklisted_devs", main.JournaledSet("bl_dev"))
+    monkeypatch.setattr(main, "exposure", 0.0)
+    monkeypatch.setattr(main, "daily_loss", 0.0)
+    main.restore_state()
+
+def _state():
+    state = main.capture_state()
+    state["blacklisted_tokens"] = sorted(state["blacklisted_tokens"])
+    state["blacklisted_devs"] = sorted(state["blacklisted_devs"])
+    return json.loads(json.dumps(state))
+
+def _trade(n: int):
+    for i in range(n):
+        mint = f"mint{n}_{i}"
+        pos = main.positions.open(mint, src="pumpfun", size=0.07, entry_price=1e-6 * (i + 1), hard_sl=0.7e-6, dev=f"dev{i}")
+        pos.last_price = 2e-6 * (i + 1)
+        main.positions.touch(mint)
+        if i % 3 == 0:
+            del main.positions[mint]
+            main.blacklisted_devs.add(f"dev{i}")
+        main.blacklisted_tokens.add(f"rug{n}_{i}")
+    main.exposure, main.daily_loss = main.positions.open_size, main.daily_loss - 0.01 * n
+    main.journal.append("totals", exposure=main.exposure, daily_loss=main.daily_loss)
+
+def test_snapshot_and_journal_tail_restore_the_same_state(monkeypatch, tmp_path):
+    _start(monkeypatch, tmp_path)
+    _trade(5)
+    asyncio.run(main.journal.flush(snapshot=True))
+    _trade(4)
+    asyncio.run(main.journal.flush())
+    before = _state()
+    tail = open(main.journal.journal_path).read().count("\n")
+    assert 0 < tail == main.journal.since_snapshot
+
+    _start(monkeypatch, tmp_path)
+    after = _state()
+    assert after == before
+    assert after["exposure"] == pytest.approx(main.positions.open_size) and after["daily_loss"] == pytest.approx(-0.09)
+
+def test_torn_final_line_is_ignored(monkeypatch, tmp_path):
+    _start(monkeypatch, tmp_path)
+    _trade(3)
+    asyncio.run(main.journal.flush())
+    before = _state()
+    with open(main.journal.journal_path, "a") as f:
+        f.write('{"op":"pos_del","mi')
+    _start(monkeypatch, tmp_path)
+    assert _state() == before
+
+def test_compaction_empties_the_journal_and_keeps_state(monkeypatch, tmp_path):
+    _start(monkeypatch, tmp_path)
+    _trade(6)
+    asyncio.run(main.journal.flush())
+    before = _state()
+    asyncio.run(main.journal.flush(snapshot=True))
+    assert os.path.getsize(main.journal.journal_path) == 0 and main.journal.since_snapshot == 0
+    _start(monkeypatch, tmp_path)
+    assert _state() == before
@@ -0,0 +1,23 @@
+import asyncio, json
+import numpy as np
+import pytest
+import main
+
+def test_model_with_wrong_shape_is_ignored(tmp_path):
+    path = tmp_path / "model.npy"
+    np.save(path, np.zeros((3, len(main.FEATURES))))
+    (tmp_path / "model.json").write_text(json.dumps({"features": list(main.FEATURES)}))
+    assert main.LogisticModel.load(str(path)) is None
+
+def test_failed_prediction_reaches_every_waiting_score(monkeypatch):
+    class Broken:
+        def predict(self, X):
+            raise FloatingPointError("bad batch")
+    scorer = main.MLScorer(Broken())
+
+    async def run():
+        return await asyncio.wait_for(asyncio.gather(scorer.score("A", "pumpfun"), scorer.score("B", "moralis"),
+                                                     return_exceptions=True), 1)
+    results = asyncio.run(run())
+    assert [type(r) for r in results] == [FloatingPointError, FloatingPointError]
+    assert not scorer._batch
@@ -0,0 +1,34 @@
+import asyncio
+import main
+from standins import FakeTelegramSink
+
+def _run(coro):
+    return asyncio.run(coro)
+
+def test_stop_behind_in_flight_sell_is_sent():
+    async def run():
+        sink = FakeTelegramSink(latency=0.3)
+        dispatcher = main.OrderDispatcher(main.ToxiBotClient(0, "", "", "@t", client=sink), rate=100, burst=10)
+        task = asyncio.ensure_future(dispatcher.run())
+        await dispatcher.send_sell("MINT", 85)
+        await asyncio.sleep(0.1)
+        await dispatcher.send_sell("MINT", 100, stop=True)
+        await asyncio.sleep(1)
+        task.cancel()
+        return [text for _, text in sink.sent], dispatcher.collapsed, dispatcher.depth()
+    sent, collapsed, depth = _run(run())
+    assert sent == ["/sell MINT 85%", "/sell MINT 100%"]
+    assert collapsed == 0 and depth == 0
+
+def test_queued_sells_collapse_to_the_largest():
+    async def run():
+        sink = FakeTelegramSink()
+        dispatcher = main.OrderDispatcher(main.ToxiBotClient(0, "", "", "@t", client=sink), rate=100, burst=10)
+        first = await dispatcher.send_sell("MINT", 50)
+        second = await dispatcher.send_sell("MINT", 100, stop=True)
+        task = asyncio.ensure_future(dispatcher.run())
+        await asyncio.sleep(0.1)
+        task.cancel()
+        return first is second, [text for _, text in sink.sent]
+    same, sent = _run(run())
+    assert same and sent == ["/sell MINT 100%"]
@@ -0,0 +1,40 @@
+import asyncio
+import pytest
+import main
+
+@pytest.mark.parametrize("policy, kept", [("drop_oldest", ["b", "c"]), ("drop_newest", ["a", "b"])])
+def test_full_queue_applies_the_drop_policy(policy, kept):
+    pipeline = main.IngestPipeline(None, maxsize=2, policy=policy)
+    assert pipeline.submit("a", "pumpfun") and pipeline.submit("b", "pumpfun")
+    assert pipeline.submit("c", "pumpfun") == (policy == "drop_oldest")
+    assert list(pipeline.queues["pumpfun"]) == kept and pipeline.pending == set(kept)
+    assert pipeline.stats["pumpfun"]["dropped"] == 1
+
+def test_workers_dedupe_share_sources_and_survive_handler_errors():
+    handled, running = [], []
+
+    async def handler(token, src):
+        running.append(token)
+        peak = len(running)
+        await asyncio.sleep(0.01)
+        running.remove(token)
+        handled.append((src, token, peak))
+        if token == "p0":
+            raise RuntimeError("handler bug")
+
+    async def run():
+        pipeline = main.IngestPipeline(handler, workers=2)
+        for i in range(4):
+            pipeline.submit(f"p{i}", "pumpfun")
+        pipeline.submit("p1", "pumpfun")
+        pipeline.submit("m0", "moralis")
+        task = asyncio.ensure_future(pipeline.run())
+        await asyncio.sleep(0.2)
+        task.cancel()
+        return pipeline
+    pipeline = asyncio.run(run())
+    assert sorted(t for _, t, _ in handled) == ["m0", "p0", "p1", "p2", "p3"]
+    assert max(peak for _, _, peak in handled) == 2
+    assert [s for s, _, _ in handled].index("moralis") < 3  # not starved behind the pumpfun backlog
+    assert pipeline.stats["pumpfun"]["deduped"] == 1 and pipeline.stats["pumpfun"]["handled"] == 4
+    assert not pipeline.pending and pipeline.depth() == 0
@@ -0,0 +1,33 @@
+import asyncio, logging
+import main
+
+class BackedUpWriter:
+    def __init__(self, buffered):
+        self.transport = type("T", (), {"get_write_buffer_size": lambda self: buffered})()
+        self.written = []
+
+    def write(self, data):
+        self.written.append(data)
+
+def test_link_drops_instead_of_buffering_without_bound():
+    link = main.ExecutorLink(0, "unused")
+    link._writer = BackedUpWriter(main.SHARD_WRITE_BUFFER_MAX + 1)
+    d = main.buy_decision("MINT", "pumpfun", 0.07, 1e-6, "buy")
+    assert asyncio.run(link.buy(d)) is False
+    link.emit("MINT", "ultra", "buy", "msg")
+    assert link._writer.written == [] and link.dropped == {"buy": 1, "event": 1}
+    link._writer = BackedUpWriter(0)
+    assert asyncio.run(link.buy(d)) is True and len(link._writer.written) == 1
+
+def test_rugcheck_logs_only_the_verdict_fields(monkeypatch, caplog):
+    payload = {"label": "Good", "supply_type": "normal", "mint": "MINT", "risks": ["x" * 500], "topHolders": [1, 2, 3]}
+
+    class Policy:
+        async def call(self, fn):
+            return payload
+    monkeypatch.setattr(main, "upstreams", {"rugcheck": Policy()})
+    monkeypatch.setattr(main, "rug_cache", main.RugVerdictCache(":memory:"))
+    with caplog.at_level(logging.INFO, logger="toxibot"):
+        assert asyncio.run(main._fetch_rugcheck("MINT")) is payload
+    logged = " ".join(r.getMessage() for r in caplog.records)
+    assert "'label': 'Good'" in logged and "risks" not in logged and "topHolders" not in logged
@@ -0,0 +1,61 @@
+import asyncio
+import pytest
+import main
+
+def _run(coro):
+    return asyncio.run(coro)
+
+async def _ok():
+    return "ok"
+
+async def _boom():
+    raise main.UpstreamError("HTTP 500")
+
+def test_throttle_halves_the_rate_and_success_recovers_it():
+    policy = main.UpstreamPolicy("t", rate=10.0, burst=5)
+
+    async def throttled():
+        raise main.Throttled("t", retry_after=0)
+    with pytest.raises(main.Throttled):
+        _run(policy.call(throttled))
+    assert policy.rate == 5.0 and policy.stats["throttled"] == 1
+    _run(policy.call(_ok))
+    assert policy.rate == pytest.approx(5.0 + 10.0 * main.UPSTREAM_RATE_STEP)
+
+def test_requests_beyond_the_wait_budget_are_shed():
+    policy = main.UpstreamPolicy("t", rate=1.0, burst=1)
+    _run(policy.call(_ok))
+    policy._tokens = -main.UPSTREAM_MAX_WAIT_S * 2
+    with pytest.raises(main.UpstreamUnavailable):
+        _run(policy.call(_ok))
+    assert policy.stats["shed"] == 1
+
+def test_circuit_opens_short_circuits_and_closes_after_a_good_probe(monkeypatch):
+    monkeypatch.setattr(main, "UPSTREAM_COOLDOWN_S", 0.05)
+    policy = main.UpstreamPolicy("t", rate=1000.0, burst=100)
+    for _ in range(main.UPSTREAM_FAIL_THRESHOLD):
+        with pytest.raises(main.UpstreamError):
+            _run(policy.call(_boom))
+    assert policy.state == "open"
+    with pytest.raises(main.UpstreamUnavailable):
+        _run(policy.call(_ok))
+    assert policy.stats["short_circuited"] == 1
+    _run(asyncio.sleep(0.06))
+    assert policy.state == "half_open"
+    with pytest.raises(main.UpstreamError):
+        _run(policy.call(_boom))  # a failed probe reopens at once
+    assert policy.state == "open"
+    _run(asyncio.sleep(0.06))
+    assert _run(policy.call(_ok)) == "ok" and policy.state == "closed"
+
+def test_slow_request_is_hedged_and_the_faster_answer_wins(monkeypatch):
+    monkeypatch.setattr(main, "HEDGE_DEFAULT_S", 0.05)
+    policy = main.UpstreamPolicy("t", rate=100.0, burst=10, hedge=True)
+    delays = iter([1.0, 0.0])
+
+    async def fetch():
+        delay = next(delays)
+        await asyncio.sleep(delay)
+        return delay
+    assert _run(asyncio.wait_for(policy.call(fetch), 0.5)) == 0.0
+    assert policy.stats["hedged"] == 1 and policy.stats["hedge_won"] == 1
@@ -0,0 +1,25 @@
+import main
+
+def test_promotes_once_per_window_when_enough_sources_agree():
+    votes = main.VoteAggregator(window=60, min_signals=2)
+    assert votes.vote("MINT", "pumpfun", 0) == (["pumpfun"], False)
+    assert votes.vote("MINT", "pumpfun", 10) == (["pumpfun"], False)
+    live, promote = votes.vote("MINT", "moralis", 20)
+    assert sorted(live) == ["moralis", "pumpfun"] and promote
+    assert votes.vote("MINT", "bitquery", 30)[1] is False
+    assert votes.source_votes == {"pumpfun": 2, "moralis": 1, "bitquery": 1}
+
+def test_stale_votes_do_not_count_and_idle_mints_are_dropped():
+    votes = main.VoteAggregator(window=60, min_signals=2)
+    votes.vote("OLD", "pumpfun", 0)
+    assert votes.vote("OLD", "moralis", 61) == (["moralis"], False)
+    votes.vote("IDLE", "pumpfun", 70)
+    votes.expire(200)
+    assert votes.votes == {} and votes.promoted == {}
+
+def test_a_mint_can_be_promoted_again_in_a_later_window():
+    votes = main.VoteAggregator(window=60, min_signals=2)
+    votes.vote("MINT", "pumpfun", 0)
+    assert votes.vote("MINT", "moralis", 1)[1]
+    votes.vote("MINT", "pumpfun", 70)
+    assert votes.vote("MINT", "moralis", 71)[1]
@@ -0,0 +1,59 @@
+import asyncio, json
+import pytest
+import main
+from standins import UpstreamStandIn
+
+MINT, DUST = "PosMint1111111111111111111111111111111111", "DustMint111111111111111111111111111111111"
+
+class FakeWs:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, raw):
+        self.sent.append(json.loads(raw))
+
+def _account(pubkey, mint, amount):
+    return {"pubkey": pubkey, "account": {"data": {"parsed": {"info": {"mint": mint, "tokenAmount": {"uiAmount": amount}}}}}}
+
+@pytest.fixture
+def tracker(monkeypatch):
+    monkeypatch.setattr(main, "positions", main.PositionTable())
+    monkeypatch.setattr(main, "activity_log", main.EventRing(100))
+    return main.WalletTracker("Owner", "http://unused", "ws://unused")
+
+def test_size_follows_the_on_chain_balance(tracker):
+    main.positions.open(MINT, src="pumpfun", size=0.07, entry_price=1e-6, hard_sl=0.7e-6, phase="filled")
+    tracker._on_token(MINT, 70_000)
+    tracker._on_token(MINT, 10_500)
+    pos = main.positions[MINT]
+    assert pos.qty == 10_500 and pos.size == pytest.approx(0.0105)
+
+def test_only_accounts_behind_open_positions_are_subscribed(tracker, monkeypatch):
+    ws = tracker._ws = FakeWs()
+    accounts = {"value": [_account("PosAcct", MINT, 70_000), _account("DustAcct", DUST, 3)]}
+
+    async def rpc_batch(calls):
+        return [{"value": 1_000_000_000}, accounts, None]
+    monkeypatch.setattr(tracker, "rpc_batch", rpc_batch)
+    main.positions.open(MINT, src="pumpfun", size=0.07, entry_price=1e-6, hard_sl=0.7e-6, phase="filled")
+    asyncio.run(tracker.reconcile())
+    subscribed = [m["params"][0] for m in ws.sent if m["method"] == "accountSubscribe"]
+    assert subscribed == ["PosAcct"] and tracker.holdings[DUST] == 3
+    tracker._on_message({"id": ws.sent[-1]["id"], "result": 7})
+    del main.positions[MINT]
+    asyncio.run(tracker.reconcile())
+    assert ws.sent[-1] == {"jsonrpc": "2.0", "id": ws.sent[-1]["id"], "method": "accountUnsubscribe", "params": [7]}
+    assert tracker.watching == set() and tracker.subs == {}
+
+def test_rpc_batches_share_one_session(tracker):
+    async def run():
+        upstream = await UpstreamStandIn(latency=0, jitter=0).start()
+        tracker.rpc_url = f"{upstream.url}/rpc"
+        await tracker.rpc_batch([("getBalance", ["Owner"])])
+        first = tracker._session
+        await tracker.rpc_batch([("getBalance", ["Owner"])])
+        same = tracker._session is first
+        await tracker._session.close()
+        await upstream.stop()
+        return same
+    assert asyncio.run(run())
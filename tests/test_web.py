@@ -0,0 +1,32 @@
+import asyncio
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+import main
+
+@pytest.mark.parametrize("last, first_seq", [("abc", 0), ("-3", 0), ("99999", 0), ("1", 2), (None, 0)])
+def test_events_resume_id(monkeypatch, last, first_seq):
+    ring = main.EventRing(100)
+    for i in range(4):
+        ring.emit(f"MINT{i}", "ultra", "buy", "msg")
+    monkeypatch.setattr(main, "activity_log", ring)
+
+    async def run():
+        async with TestClient(TestServer(main.build_web_app())) as client:
+            resp = await client.get("/events", headers={"Last-Event-ID": last} if last else {})
+            assert resp.status == 200
+            line = await asyncio.wait_for(resp.content.readline(), 2)
+            resp.close()
+            return line.decode()
+    assert asyncio.run(run()) == f"id: {first_seq}\n"
+
+def test_overlapping_profiles_are_rejected():
+    async def run():
+        async with TestClient(TestServer(main.build_web_app())) as client:
+            first = asyncio.ensure_future(client.get("/debug/profile", params={"seconds": "0.3", "interval": "0.0001"}))
+            await asyncio.sleep(0.1)
+            second = await client.get("/debug/profile", params={"seconds": "0.1"})
+            resp = await first
+            return second.status, resp.status, (await resp.text()).splitlines()[0]
+    second, first, header = asyncio.run(run())
+    assert second == 409 and first == 200
+    assert header.endswith(f"every {main.PROFILE_MIN_INTERVAL_S * 1000:.0f}ms")
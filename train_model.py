@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# Fits the logistic scoring model from RECORD_PATH captures and writes MODEL_PATH (+ .json sidecar).
+#   python train_model.py capture1.jsonl.gz capture2.jsonl.gz --out model.npy
+# A sample is every recorded feature vector ("feat"). Its label is the P/L sign of the position if one
+# was opened and closed ("outcome"), otherwise whether the DexScreener price recorded after the decision
+# reached --target-x times the price at decision within --horizon seconds.
+import argparse, bisect, collections, gzip, json, os, time
+from typing import Dict, List, Tuple
+
+from standins import offline_env
+offline_env()
+
+import numpy as np
+import main
+
+def load_samples(paths: List[str], horizon: float, target_x: float) -> Tuple[np.ndarray, np.ndarray]:
+    feats: List[tuple] = []
+    outcomes: Dict[str, float] = {}
+    prices: Dict[str, Tuple[List[float], List[float]]] = collections.defaultdict(lambda: ([], []))
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt") as f:
+            for line in f:
+                try:
+                    e = json.loads(line)
+                except ValueError:
+                    continue
+                if e["k"] == "feat":
+                    feats.append((e["t"], e["m"], e["x"]))
+                elif e["k"] == "outcome":
+                    outcomes[e["m"]] = e["pl"]
+                elif e["k"] == "dex" and e.get("d") and e["d"][0]:
+                    ts, ps = prices[e["m"]]
+                    ts.append(e["t"])
+                    ps.append(e["d"][0])
+    for ts, ps in prices.values():
+        order = np.argsort(ts, kind="stable")
+        ts[:] = [ts[i] for i in order]
+        ps[:] = [ps[i] for i in order]
+    X, y = [], []
+    for t, mint, x in feats:
+        if mint in outcomes:
+            label = outcomes[mint] > 0
+        else:
+            ts, ps = prices.get(mint, ((), ()))
+            i = bisect.bisect_right(ts, t) - 1
+            if i < 0:
+                continue
+            j = bisect.bisect_right(ts, t + horizon)
+            label = max(ps[i:j]) >= ps[i] * target_x
+        X.append([np.nan if v is None else v for v in x])
+        y.append(float(label))
+    return np.array(X, dtype=float).reshape(-1, len(main.FEATURES)), np.array(y)
+
+def auc(y: np.ndarray, p: np.ndarray) -> float:
+    pos, neg = y == 1, y == 0
+    if not pos.any() or not neg.any():
+        return float("nan")
+    ranks = np.empty(len(p))
+    ranks[np.argsort(p, kind="stable")] = np.arange(1, len(p) + 1)
+    return float((ranks[pos].sum() - pos.sum() * (pos.sum() + 1) / 2) / (pos.sum() * neg.sum()))
+
+def fit(X: np.ndarray, y: np.ndarray, l2: float, epochs: int, lr: float) -> np.ndarray:
+    seen = (~np.isnan(X)).sum(axis=0)
+    mean = np.where(seen > 0, np.nansum(X, axis=0) / np.maximum(seen, 1), 0.0)
+    X = np.where(np.isnan(X), mean, X)
+    std = X.std(axis=0)
+    std = np.where(std > 1e-9, std, 1.0)
+    Z = (X - mean) / std
+    # Class-balanced weights so rare winners are not drowned out.
+    sw = np.where(y == 1, 0.5 / max(y.mean(), 1e-9), 0.5 / max(1 - y.mean(), 1e-9))
+    w, b = np.zeros(X.shape[1]), 0.0
+    for _ in range(epochs):
+        p = 1 / (1 + np.exp(-(Z @ w + b)))
+        g = sw * (p - y) / len(y)
+        w -= lr * (Z.T @ g + l2 * w)
+        b -= lr * g.sum()
+    bias = np.zeros(X.shape[1])
+    bias[0] = b
+    return np.stack([mean, std, w, bias])
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("captures", nargs="+")
+    ap.add_argument("--out", default=main.MODEL_PATH)
+    ap.add_argument("--horizon", type=float, default=30 * 60, help="seconds after the decision to look for --target-x")
+    ap.add_argument("--target-x", type=float, default=main.ULTRA_TP_X)
+    ap.add_argument("--l2", type=float, default=1e-3)
+    ap.add_argument("--epochs", type=int, default=2000)
+    ap.add_argument("--lr", type=float, default=0.5)
+    ap.add_argument("--holdout", type=float, default=0.2, help="latest fraction of samples kept for evaluation")
+    args = ap.parse_args()
+    X, y = load_samples(args.captures, args.horizon, args.target_x)
+    if len(y) < 10 or y.min() == y.max():
+        raise SystemExit(f"need both outcomes among at least 10 samples, got {len(y)} (positives={int(y.sum())})")
+    split = int(len(y) * (1 - args.holdout))
+    params = fit(X[:split], y[:split], args.l2, args.epochs, args.lr)
+    model = main.LogisticModel(params, {})
+    holdout_auc = auc(y[split:], model.predict(X[split:])) if split < len(y) else float("nan")
+    params = fit(X, y, args.l2, args.epochs, args.lr)
+    np.save(args.out, params)
+    meta = {"features": list(main.FEATURES), "samples": len(y), "positives": int(y.sum()),
+            "auc": round(holdout_auc, 4), "horizon": args.horizon, "target_x": args.target_x, "trained_at": time.time()}
+    with open(os.path.splitext(args.out)[0] + ".json", "w") as f:
+        json.dump(meta, f, indent=1)
+    t0 = time.perf_counter()
+    scores = main.LogisticModel(np.load(args.out, mmap_mode="r"), meta).predict(X)
+    per_token_us = (time.perf_counter() - t0) / len(y) * 1e6
+    print(f"wrote {args.out}: {len(y)} samples, {int(y.sum())} positive, holdout AUC {holdout_auc:.3f}, "
+          f"{per_token_us:.2f}us/token batched")
+    for name, weight in sorted(zip(main.FEATURES, params[2]), key=lambda p: -abs(p[1]))[:8]:
+        print(f"  {name:>20} {weight:+.3f}")